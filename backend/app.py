@@ -1,12 +1,17 @@
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from flask import Flask, request, jsonify, render_template, redirect, url_for, send_from_directory, flash, Response
+from flask import Flask, request, jsonify, render_template, redirect, url_for, send_from_directory, flash, Response, stream_with_context, g, has_request_context, abort
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
+from urllib.parse import quote
+import mimetypes
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import extract
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.utils import secure_filename
 import uuid
 import pytz
 from datetime import datetime, timedelta, time
@@ -17,9 +22,26 @@ import io
 from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature
 import string
+import re
+import threading
+from collections import OrderedDict
+from time import monotonic, perf_counter
+import json
+import base64
+import hashlib
+import hmac
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, messaging
 from flask_cors import CORS
+import click
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -36,12 +58,38 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=3650)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
-app.config['MAIL_SERVER'] = 'smtp.googlemail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['FCM_TRANSPORT'] = os.environ.get('FCM_TRANSPORT', 'firebase')
+app.config['FCM_HTTP_ENDPOINT'] = os.environ.get('FCM_HTTP_ENDPOINT', 'http://127.0.0.1:9099')
+app.config['FCM_PROJECT_ID'] = os.environ.get('FCM_PROJECT_ID', 'okoce')
+app.config['FCM_DISPATCH_WORKERS'] = int(os.environ.get('FCM_DISPATCH_WORKERS', 8))
+
+# Pengiriman file statis (upload & APK): '' = dilayani Flask, 'x-accel' = nginx X-Accel-Redirect,
+# 'x-sendfile' = header X-Sendfile (Apache/lighttpd). Prefix adalah lokasi internal di proxy.
+app.config['STATIC_OFFLOAD'] = os.environ.get('STATIC_OFFLOAD', '').lower()
+app.config['STATIC_OFFLOAD_PREFIX'] = os.environ.get('STATIC_OFFLOAD_PREFIX', '/_protected').rstrip('/')
+app.config['USE_X_SENDFILE'] = app.config['STATIC_OFFLOAD'] == 'x-sendfile'
+app.config['APK_MAX_CONCURRENT_DOWNLOADS'] = int(os.environ.get('APK_MAX_CONCURRENT_DOWNLOADS', 8))
+# Batas long-poll status tiket yang ditahan bersamaan per proses; sisanya langsung dijawab
+# agar thread gthread tetap tersedia untuk API lain (check-in, scanner).
+app.config['TICKET_WAIT_MAX_WAITERS'] = int(os.environ.get('TICKET_WAIT_MAX_WAITERS', 16))
+
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.googlemail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.getenv("MAIL_USERNAME")
 app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
 app.config['MAIL_DEFAULT_SENDER'] = ('OK OCE Admin', os.environ.get('MAIL_SENDER'))
+app.config['MAIL_QUEUE_WORKER'] = os.environ.get('MAIL_QUEUE_WORKER', 'true').lower() == 'true'
+app.config['MAIL_QUEUE_BATCH_SIZE'] = 50
+app.config['MAIL_QUEUE_MAX_ATTEMPTS'] = 6
+
+# Akses /metrics selain admin yang login: bearer token scraper dan/atau daftar IP yang diizinkan
+# (dipisah koma). Keduanya kosong = hanya admin; IP loopback tidak otomatis dipercaya.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None
+app.config['METRICS_ALLOWLIST'] = {ip.strip() for ip in os.environ.get('METRICS_ALLOWLIST', '').split(',') if ip.strip()}
+
+# None = ikut TESTING: anggaran query per endpoint hanya ditegakkan saat test.
+app.config['QUERY_BUDGETS_ENFORCED'] = {'true': True, 'false': False}.get(os.environ.get('QUERY_BUDGETS_ENFORCED', '').lower())
 
 mail = Mail(app)
 s = URLSafeTimedSerializer(app.config['SECRET_KEY'])
@@ -62,9 +110,57 @@ login_manager.init_app(app)
 login_manager.login_view = 'web_login'
 login_manager.login_message_category = "warning"
 
+IDENTITY_CACHE_TTL = 60
+IDENTITY_CACHE_MAX = 10000
+
+class SessionUser(UserMixin):
+    """
+    Identitas ringan untuk current_user, bukan objek ORM. Hanya berisi field yang dibaca
+    dari current_user; perubahan data user harus lewat query User biasa.
+    """
+    def __init__(self, id, role, name, okoce_id, has_business, fcm_token):
+        self.id = id
+        self.role = role
+        self.name = name
+        self.okoce_id = okoce_id
+        self.has_business = has_business
+        self.fcm_token = fcm_token
+
+_identity_cache = OrderedDict()
+_identity_cache_lock = threading.Lock()
+identity_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def invalidate_user_identity(user_id):
+    with _identity_cache_lock:
+        if _identity_cache.pop(user_id, None) is not None:
+            identity_cache_stats['invalidations'] += 1
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """Cache TTL per proses agar setiap request terautentikasi tidak perlu query tabel user."""
+    user_id = int(user_id)
+    now = monotonic()
+    with _identity_cache_lock:
+        entry = _identity_cache.get(user_id)
+        if entry and entry[0] > now:
+            _identity_cache.move_to_end(user_id)
+            identity_cache_stats['hits'] += 1
+            return entry[1]
+        identity_cache_stats['misses'] += 1
+
+    row = db.session.query(
+        User.id, User.role, User.name, User.okoce_id, User.has_business, User.fcm_token
+    ).filter(User.id == user_id).first()
+    if not row:
+        return None
+
+    identity = SessionUser(*row)
+    with _identity_cache_lock:
+        _identity_cache[user_id] = (now + IDENTITY_CACHE_TTL, identity)
+        _identity_cache.move_to_end(user_id)
+        while len(_identity_cache) > IDENTITY_CACHE_MAX:
+            _identity_cache.popitem(last=False)
+    return identity
 
 @login_manager.unauthorized_handler
 def unauthorized():
@@ -88,6 +184,332 @@ def role_required(roles_list):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Poster event disimpan dengan nama hash konten (posters/<sha256>.<ext>), lalu varian
+# thumb/card/full dalam WebP & JPEG dibuat di thread terpisah agar request upload tidak
+# menunggu. Selama varian belum ada (atau Pillow tidak terpasang) URL jatuh ke file asli.
+POSTER_DIR = 'posters'
+POSTER_VARIANTS = {'thumb': 320, 'card': 800, 'full': 1600}
+POSTER_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_poster_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='poster')
+
+def poster_variant_path(image_filename, size, extension='webp'):
+    return f"{os.path.splitext(image_filename)[0]}-{size}.{extension}"
+
+def store_poster(data, original_filename):
+    """Menyimpan byte poster sebagai posters/<sha256>.<ext>; upload yang sama hanya disimpan sekali."""
+    extension = original_filename.rsplit('.', 1)[1].lower().replace('jpeg', 'jpg')
+    image_filename = f"{POSTER_DIR}/{hashlib.sha256(data).hexdigest()[:24]}.{extension}"
+    path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return image_filename
+
+def save_event_poster(file):
+    """Menyimpan upload poster dan menjadwalkan pembuatan variannya di thread lain."""
+    image_filename = store_poster(file.read(), file.filename)
+    _poster_executor.submit(generate_poster_variants, os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
+    return image_filename
+
+def generate_poster_variants(original_path):
+    """Membuat semua varian poster yang belum ada. Mengembalikan jumlah file yang ditulis."""
+    if Image is None:
+        return 0
+    base = os.path.splitext(original_path)[0]
+    written = 0
+    try:
+        with Image.open(original_path) as source:
+            image = ImageOps.exif_transpose(source)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            for size, width in POSTER_VARIANTS.items():
+                variant = image.copy()
+                variant.thumbnail((width, width * 4))
+                for extension, (image_format, options) in POSTER_FORMATS.items():
+                    target = f"{base}-{size}.{extension}"
+                    if os.path.exists(target):
+                        continue
+                    temp_path = f"{target}.{threading.get_ident()}.tmp"
+                    variant.save(temp_path, image_format, **options)
+                    os.replace(temp_path, target)
+                    written += 1
+    except Exception as e:
+        print(f"Gagal membuat varian poster {original_path}: {e}")
+    return written
+
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_DEFAULT_MAX_AGE = 3600
+HASHED_UPLOAD_PATTERN = re.compile(r'^' + POSTER_DIR + r'/[0-9a-f]{24}(-[a-z]+)?\.[a-z]+$')
+
+_file_etags = {}
+_file_etags_lock = threading.Lock()
+
+def file_content_etag(path):
+    """ETag dari hash isi file, di-cache per (mtime, ukuran) agar file besar hanya di-hash sekali."""
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _file_etags_lock:
+        cached = _file_etags.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:32]
+    with _file_etags_lock:
+        _file_etags[path] = (version, etag)
+    return etag
+
+def send_static_asset(directory, filename, location, max_age, immutable=False, etag=None, **send_kwargs):
+    """
+    Mengirim file dengan ETag hash isi, Cache-Control publik, dan dukungan Range.
+    Pada mode 'x-accel' Flask hanya menjawab header (termasuk 304) dan nginx yang
+    mengirim isi file dari `<STATIC_OFFLOAD_PREFIX>/<location>/`.
+    """
+    path = safe_join(os.path.join(app.root_path, directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    etag = etag or file_content_etag(path)
+
+    if app.config['STATIC_OFFLOAD'] == 'x-accel':
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(status=200, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = f"{app.config['STATIC_OFFLOAD_PREFIX']}/{location}/{quote(filename)}"
+            if send_kwargs.get('as_attachment'):
+                response.headers.set('Content-Disposition', 'attachment', filename=send_kwargs.get('download_name', filename))
+        response.set_etag(etag)
+    else:
+        response = send_from_directory(directory, filename, etag=etag, max_age=max_age, conditional=True, **send_kwargs)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+def poster_urls(image_filename):
+    """URL absolut varian poster (WebP) per ukuran; file asli bila varian belum tersedia."""
+    if not image_filename:
+        return None
+    original = url_for('serve_upload', filename=image_filename, _external=True)
+    urls = {}
+    for size in POSTER_VARIANTS:
+        variant = poster_variant_path(image_filename, size)
+        if image_filename.startswith(POSTER_DIR + '/') and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], variant)):
+            urls[size] = url_for('serve_upload', filename=variant, _external=True)
+        else:
+            urls[size] = original
+    return urls
+
+# --- Metrics per proses (format Prometheus di /metrics) ---
+# Latency & jumlah/waktu SQL dicatat per endpoint, ditambah panggilan keluar ke FCM & SMTP.
+# Nilai disimpan per proses worker; tiap worker gunicorn menampilkan angkanya sendiri.
+
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_SQL_COUNT_BUCKETS = (1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+_metrics_lock = threading.Lock()
+_endpoint_metrics = {}
+_request_counts = {}
+_outbound_calls = {}
+_outbound_messages = {}
+
+def new_endpoint_metrics():
+    return {
+        'latency_buckets': [0] * len(METRICS_LATENCY_BUCKETS), 'latency_sum': 0.0, 'count': 0,
+        'sql_buckets': [0] * len(METRICS_SQL_COUNT_BUCKETS), 'sql_count': 0, 'sql_seconds': 0.0,
+    }
+
+def observe_buckets(buckets, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            buckets[i] += 1
+
+def record_outbound_call(service, outcome, messages=None):
+    """Mencatat satu panggilan ke layanan luar ('fcm'/'smtp'); `messages` = {'sent': n, 'failed': n}."""
+    with _metrics_lock:
+        _outbound_calls[(service, outcome)] = _outbound_calls.get((service, outcome), 0) + 1
+        for message_outcome, count in (messages or {}).items():
+            key = (service, message_outcome)
+            _outbound_messages[key] = _outbound_messages.get(key, 0) + count
+
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def metrics_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(perf_counter())
+
+@db.event.listens_for(Engine, 'after_cursor_execute')
+def metrics_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_start'].pop()
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_seconds += perf_counter() - started
+        if 'query_budget_statements' in g:
+            g.query_budget_statements.append(statement)
+
+@db.event.listens_for(Engine, 'handle_error')
+def metrics_discard_failed_query(context):
+    if context.connection is not None and context.connection.info.get('metrics_query_start'):
+        context.connection.info['metrics_query_start'].pop()
+
+@app.before_request
+def metrics_start_request():
+    g.metrics_started = perf_counter()
+    g.metrics_sql_count = 0
+    g.metrics_sql_seconds = 0.0
+    if query_budgets_enforced():
+        g.query_budget_statements = []
+
+@app.after_request
+def metrics_capture_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def metrics_finish_request(error=None):
+    """Dicatat saat teardown agar response streaming (CSV) ikut terhitung sampai selesai."""
+    if 'metrics_started' not in g:
+        return
+    elapsed = perf_counter() - g.metrics_started
+    endpoint = request.endpoint or 'unmatched'
+    status = str(g.get('metrics_status', 500))
+    with _metrics_lock:
+        metrics = _endpoint_metrics.get((endpoint, request.method))
+        if metrics is None:
+            metrics = _endpoint_metrics[(endpoint, request.method)] = new_endpoint_metrics()
+        metrics['count'] += 1
+        metrics['latency_sum'] += elapsed
+        observe_buckets(metrics['latency_buckets'], METRICS_LATENCY_BUCKETS, elapsed)
+        metrics['sql_count'] += g.metrics_sql_count
+        metrics['sql_seconds'] += g.metrics_sql_seconds
+        observe_buckets(metrics['sql_buckets'], METRICS_SQL_COUNT_BUCKETS, g.metrics_sql_count)
+        key = (endpoint, request.method, status)
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+    g.pop('metrics_started')
+    if 'query_budget_statements' in g:
+        check_query_budget(endpoint, g.pop('query_budget_statements'))
+
+# Anggaran jumlah query per request untuk endpoint yang pernah kena N+1. Angka sudah termasuk
+# 1 query user_loader saat cache identitas miss, dan tidak boleh tumbuh mengikuti jumlah baris
+# per halaman. Export CSV dihitung untuk satu chunk (<= EXPORT_CHUNK_SIZE tiket).
+# Sengaja TANPA headroom: setiap angka = rincian query tetap di komentarnya, jadi satu query
+# tambahan (termasuk N+1 kecil) langsung gagal di tests/test_query_budgets.py. Query baru yang
+# memang perlu: naikkan angkanya dan perbarui rinciannya.
+QUERY_BUDGETS = {
+    'dashboard': 3,                 # user + halaman event + count (total halaman)
+    'archived_events_list': 3,      # user + halaman event + count
+    'event_detail': 3,              # user + event + tiket/peserta/check-in (satu join)
+    'panitia_dashboard': 2,         # user + daftar event
+    'reports': 3,                   # user + snapshot bulan lampau + hitung live bila snapshot belum ada
+    'test_analytics': 4,            # user + stempel cache + event ber-tes + histogram nilai
+    'download_monthly_report': 3,   # sama dengan reports
+    'public_get_events': 2,         # halaman event + count (mode page/total)
+    'get_events': 2,                # user + halaman event
+    'get_user_tickets': 3,          # user + versi ETag + daftar tiket (dilewati saat 304)
+    'buy_ticket': 7,                # user + tiket lama + event + cek UMKM + reservasi kuota + insert + reload tiket
+    'check_in': 10,                 # user + tiket + user tiket + event + 3 tulis check-in + reload tiket/user/event
+    'mobile_panitia_scan': 8,       # user + tiket + 3 tulis check-in + reload tiket/user/event
+    'get_user_details_admin': 4,    # user + user detail + graf UMKM + nilai test
+    'get_test_questions_api': 3,    # user + versi soal + soal (cache dingin)
+    'submit_test_api': 4,           # user + versi soal & nilai + soal (cache dingin) + insert/update nilai
+    'download_csv': 7,              # user + event + chunk tiket + check-in + graf UMKM + nilai + chunk kosong
+}
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def query_budgets_enforced():
+    enforced = app.config.get('QUERY_BUDGETS_ENFORCED')
+    return app.testing if enforced is None else enforced
+
+def check_query_budget(endpoint, statements):
+    """Gagal (exception) bila endpoint menjalankan lebih banyak query dari anggarannya, dengan daftar query-nya."""
+    budget = QUERY_BUDGETS.get(endpoint)
+    if budget is None or len(statements) <= budget:
+        return
+    listing = '\n'.join(f"  {i}. {' '.join(statement.split())[:300]}" for i, statement in enumerate(statements, start=1))
+    raise QueryBudgetExceeded(f"{endpoint} menjalankan {len(statements)} query (anggaran {budget}):\n{listing}")
+
+def prometheus_labels(**labels):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + '}'
+
+def prometheus_histogram(lines, name, labels, bounds, buckets, total_sum, count):
+    for bound, value in zip(bounds, buckets):
+        lines.append(f"{name}_bucket{prometheus_labels(**labels, le=bound)} {value}")
+    lines.append(f"{name}_bucket{prometheus_labels(**labels, le='+Inf')} {count}")
+    lines.append(f"{name}_sum{prometheus_labels(**labels)} {total_sum}")
+    lines.append(f"{name}_count{prometheus_labels(**labels)} {count}")
+
+def render_metrics():
+    """Menyusun semua metrics dalam format teks Prometheus (exposition format 0.0.4)."""
+    with _metrics_lock:
+        endpoints = {key: dict(value, latency_buckets=list(value['latency_buckets']), sql_buckets=list(value['sql_buckets']))
+                     for key, value in _endpoint_metrics.items()}
+        request_counts = dict(_request_counts)
+        outbound_calls = dict(_outbound_calls)
+        outbound_messages = dict(_outbound_messages)
+    with _identity_cache_lock:
+        identity = dict(identity_cache_stats, size=len(_identity_cache))
+
+    lines = [
+        '# HELP okoce_http_requests_total Jumlah request per endpoint, method, dan status.',
+        '# TYPE okoce_http_requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(request_counts.items()):
+        lines.append(f"okoce_http_requests_total{prometheus_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+    lines += ['# HELP okoce_http_request_duration_seconds Latency request per endpoint.',
+              '# TYPE okoce_http_request_duration_seconds histogram']
+    for (endpoint, method), m in sorted(endpoints.items()):
+        prometheus_histogram(lines, 'okoce_http_request_duration_seconds', {'endpoint': endpoint, 'method': method},
+                             METRICS_LATENCY_BUCKETS, m['latency_buckets'], round(m['latency_sum'], 6), m['count'])
+
+    lines += ['# HELP okoce_sql_queries_per_request Jumlah statement SQL per request (N+1 terlihat di bucket atas).',
+              '# TYPE okoce_sql_queries_per_request histogram']
+    for (endpoint, method), m in sorted(endpoints.items()):
+        prometheus_histogram(lines, 'okoce_sql_queries_per_request', {'endpoint': endpoint, 'method': method},
+                             METRICS_SQL_COUNT_BUCKETS, m['sql_buckets'], m['sql_count'], m['count'])
+
+    lines += ['# HELP okoce_sql_duration_seconds_total Total waktu eksekusi SQL per endpoint.',
+              '# TYPE okoce_sql_duration_seconds_total counter']
+    for (endpoint, method), m in sorted(endpoints.items()):
+        lines.append(f"okoce_sql_duration_seconds_total{prometheus_labels(endpoint=endpoint, method=method)} {round(m['sql_seconds'], 6)}")
+
+    lines += ['# HELP okoce_outbound_calls_total Panggilan ke layanan luar (FCM, SMTP).',
+              '# TYPE okoce_outbound_calls_total counter']
+    for (service, outcome), count in sorted(outbound_calls.items()):
+        lines.append(f"okoce_outbound_calls_total{prometheus_labels(service=service, outcome=outcome)} {count}")
+
+    lines += ['# HELP okoce_outbound_messages_total Pesan (notifikasi/email) yang dikirim ke layanan luar.',
+              '# TYPE okoce_outbound_messages_total counter']
+    for (service, outcome), count in sorted(outbound_messages.items()):
+        lines.append(f"okoce_outbound_messages_total{prometheus_labels(service=service, outcome=outcome)} {count}")
+
+    lines += ['# HELP okoce_identity_cache_events_total Lookup & invalidasi cache identitas sesi.',
+              '# TYPE okoce_identity_cache_events_total counter']
+    for name in ['hits', 'misses', 'invalidations']:
+        lines.append(f"okoce_identity_cache_events_total{prometheus_labels(event=name)} {identity[name]}")
+    lines += ['# HELP okoce_identity_cache_size Jumlah identitas di cache.',
+              '# TYPE okoce_identity_cache_size gauge',
+              f"okoce_identity_cache_size {identity['size']}"]
+    return '\n'.join(lines) + '\n'
+
 def send_broadcast_notification(title, body, event_id):
     """
     Mengirim notifikasi ke semua user yang subscribe ke topic 'new_events'.
@@ -108,9 +530,11 @@ def send_broadcast_notification(title, body, event_id):
         )
         
         response = messaging.send(message)
+        record_outbound_call('fcm', 'success', {'sent': 1})
         print(f'Successfully sent message to topic {topic}: {response}')
         return True
     except Exception as e:
+        record_outbound_call('fcm', 'error', {'failed': 1})
         print(f'Error sending broadcast message: {e}')
         return False
     
@@ -131,12 +555,73 @@ def send_single_notification(token, title, body, event_id):
             }
         )
         response = messaging.send(message)
+        record_outbound_call('fcm', 'success', {'sent': 1})
         print(f"Successfully sent reminder to token {token[:10]}...: {response}")
         return True
     except Exception as e:
+        record_outbound_call('fcm', 'error', {'failed': 1})
         print(f"Error sending single notification: {e}")
         return False
 
+QUESTION_CACHE_TTL = 600
+
+_question_cache = {}
+_question_cache_lock = threading.Lock()
+
+def get_event_question_set(event_id, version):
+    """
+    Payload soal (JSON siap kirim) dan kunci jawaban {nomor: jawaban} per event, di-cache per proses.
+    Entri hanya dipakai bila `version` (Event.questions_version yang baru dibaca pemanggil) sama,
+    jadi perubahan soal dari worker lain langsung terlihat. Mengembalikan None bila event belum
+    punya soal (tidak di-cache agar soal baru langsung terlihat).
+    """
+    now = monotonic()
+    with _question_cache_lock:
+        entry = _question_cache.get(event_id)
+        if entry and entry[0] > now and entry[1] == version:
+            return entry[2]
+
+    questions = db.session.query(
+        EventQuestion.id, EventQuestion.question_number, EventQuestion.question_text,
+        EventQuestion.option_a, EventQuestion.option_b, EventQuestion.option_c, EventQuestion.option_d,
+        EventQuestion.correct_answer
+    ).filter(EventQuestion.event_id == event_id).order_by(EventQuestion.question_number).all()
+    if not questions:
+        return None
+
+    question_set = {
+        'payload': app.json.dumps([{
+            'id': q.id,
+            'number': q.question_number,
+            'text': q.question_text,
+            'options': {
+                'A': q.option_a,
+                'B': q.option_b,
+                'C': q.option_c,
+                'D': q.option_d
+            }
+        } for q in questions]),
+        'answer_key': {str(q.question_number): q.correct_answer for q in questions},
+    }
+    with _question_cache_lock:
+        _question_cache[event_id] = (now + QUESTION_CACHE_TTL, version, question_set)
+    return question_set
+
+def bump_event_questions_version(event_id):
+    """Menandai soal event berubah; ikut commit bersama perubahan soalnya."""
+    Event.query.filter_by(id=event_id).update(
+        {Event.questions_version: Event.questions_version + 1}, synchronize_session=False
+    )
+
+def invalidate_event_questions(event_id):
+    with _question_cache_lock:
+        _question_cache.pop(event_id, None)
+
+def grade_test_answers(answer_key, user_answers):
+    """Nilai 0-100 dari jumlah jawaban yang cocok dengan kunci."""
+    correct_count = sum(1 for number, answer in answer_key.items() if user_answers.get(number) == answer)
+    return int((correct_count / len(answer_key)) * 100)
+
 def save_event_questions(event_id, form_data):
     """Menyimpan atau update 5 soal dari form ke database."""
     EventQuestion.query.filter_by(event_id=event_id).delete()
@@ -155,7 +640,91 @@ def save_event_questions(event_id, form_data):
                 correct_answer=form_data.get(f'q_{i}_answer')
             )
             db.session.add(question)
+    bump_event_questions_version(event_id)
     db.session.commit()
+    invalidate_event_questions(event_id)
+
+FCM_MULTICAST_LIMIT = 500
+
+def fcm_firebase_transport(tokens, title, body, data):
+    """Transport default: satu multicast Firebase (maks 500 token) per panggilan."""
+    message = messaging.MulticastMessage(
+        notification=messaging.Notification(title=title, body=body),
+        tokens=tokens,
+        data=data
+    )
+    response = messaging.send_each_for_multicast(message)
+    return [
+        (token, r.success, None if r.success else str(r.exception))
+        for token, r in zip(tokens, response.responses)
+    ]
+
+def fcm_http_transport(tokens, title, body, data):
+    """
+    Transport HTTP v1 ke FCM_HTTP_ENDPOINT, untuk menjalankan dispatcher terhadap
+    server FCM palsu lokal (tanpa kredensial Firebase).
+    """
+    url = f"{app.config['FCM_HTTP_ENDPOINT'].rstrip('/')}/v1/projects/{app.config['FCM_PROJECT_ID']}/messages:send"
+    results = []
+    for token in tokens:
+        payload = json.dumps({'message': {
+            'token': token,
+            'notification': {'title': title, 'body': body},
+            'data': data
+        }}).encode('utf-8')
+        req = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(req, timeout=10):
+                results.append((token, True, None))
+        except urllib.error.HTTPError as e:
+            results.append((token, False, f"HTTP {e.code}"))
+        except urllib.error.URLError as e:
+            results.append((token, False, str(e.reason)))
+    return results
+
+FCM_TRANSPORTS = {
+    'firebase': fcm_firebase_transport,
+    'http': fcm_http_transport,
+}
+
+def dispatch_notifications(jobs, transport=None, workers=None):
+    """
+    Mengirim banyak notifikasi secara paralel.
+    `jobs` berisi (title, body, data, tokens); token dipecah menjadi batch multicast
+    maks 500 lalu dikirim oleh thread pool. Mengembalikan statistik sukses/gagal per token.
+    """
+    transport = transport or FCM_TRANSPORTS[app.config['FCM_TRANSPORT']]
+    workers = workers or app.config['FCM_DISPATCH_WORKERS']
+
+    batches = []
+    for title, body, data, tokens in jobs:
+        for i in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+            batches.append((tokens[i:i + FCM_MULTICAST_LIMIT], title, body, data))
+
+    stats = {'batches': len(batches), 'sent': 0, 'failed': 0, 'failures': []}
+    if not batches:
+        return stats
+
+    def send_batch(batch):
+        tokens = batch[0]
+        try:
+            results = transport(*batch)
+        except Exception as e:
+            record_outbound_call('fcm', 'error', {'failed': len(tokens)})
+            return [(token, False, str(e)) for token in tokens]
+        sent = sum(1 for _, success, _ in results if success)
+        record_outbound_call('fcm', 'success', {'sent': sent, 'failed': len(results) - sent})
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+        for results in executor.map(send_batch, batches):
+            for token, success, error in results:
+                if success:
+                    stats['sent'] += 1
+                else:
+                    stats['failed'] += 1
+                    stats['failures'].append((token, error))
+    return stats
 
 @app.cli.command("send-reminders")
 def send_reminders_command():
@@ -176,48 +745,41 @@ def send_reminders_command():
     
     print(f"--- [Scheduled Task] Mencari event antara {start_of_tomorrow} dan {start_of_day_after_tomorrow} (UTC) ---")
 
-    events_tomorrow = Event.query.filter(
+    rows = db.session.query(
+        Event.id, Event.title, Event.tgl_mulai_event, User.fcm_token
+    ).join(Ticket, Ticket.event_id == Event.id).join(User, Ticket.user_id == User.id).filter(
         Event.tgl_mulai_event >= start_of_tomorrow,
         Event.tgl_mulai_event < start_of_day_after_tomorrow,
-        Event.is_archived == False
-    ).all()
+        Event.is_archived == False,
+        User.fcm_token.isnot(None)
+    ).order_by(Event.id).all()
     
-    if not events_tomorrow:
-        print("--- [Scheduled Task] Tidak ada event yang dijadwalkan untuk besok. Selesai. ---")
+    if not rows:
+        print("--- [Scheduled Task] Tidak ada peserta event besok yang bisa dikirimi pengingat. Selesai. ---")
         return
 
-    print(f"--- [Scheduled Task] Ditemukan {len(events_tomorrow)} event untuk dikirim pengingat. ---")
-    
-    total_reminders_sent = 0
-    
-    for event in events_tomorrow:
-        tickets = Ticket.query.filter_by(event_id=event.id).all()
-        
-        if not tickets:
-            continue 
+    jobs = {}
+    for event_id, title, tgl_mulai_event, token in rows:
+        if event_id not in jobs:
+            dt_aware_wib = pytz.utc.localize(tgl_mulai_event).astimezone(LOCAL_TZ)
+            tanggal_wib = dt_aware_wib.strftime('%d %B') 
+            waktu_wib = dt_aware_wib.strftime('%H:%M WIB') 
+            jobs[event_id] = (
+                f"Pengingat Event: '{title}' Besok!",
+                f"Jangan lupa, event Anda akan dimulai besok, {tanggal_wib} pukul {waktu_wib}.",
+                {'event_id': str(event_id), 'click_action': 'FLUTTER_NOTIFICATION_CLICK'},
+                []
+            )
+        jobs[event_id][3].append(token)
 
-        print(f"--- Mengirim {len(tickets)} pengingat untuk event: '{event.title}' ---")
-        
-        for ticket in tickets:
-            user = ticket.user
-            
-            if user and user.fcm_token:
-                
-                dt_aware_utc = pytz.utc.localize(event.tgl_mulai_event)
-                dt_aware_wib = dt_aware_utc.astimezone(LOCAL_TZ)
-                
-                tanggal_wib = dt_aware_wib.strftime('%d %B') 
-                waktu_wib = dt_aware_wib.strftime('%H:%M WIB') 
-
-                send_single_notification(
-                    token=user.fcm_token,
-                    title=f"Pengingat Event: '{event.title}' Besok!",
-                    body=f"Jangan lupa, event Anda akan dimulai besok, {tanggal_wib} pukul {waktu_wib}.",
-                    event_id=event.id
-                )
-                total_reminders_sent += 1
+    print(f"--- [Scheduled Task] Mengirim {len(rows)} pengingat untuk {len(jobs)} event. ---")
+
+    stats = dispatch_notifications(list(jobs.values()))
+
+    for token, error in stats['failures'][:20]:
+        print(f"--- Gagal kirim ke token {token[:10]}...: {error} ---")
             
-    print(f"--- [Scheduled Task] Selesai. Total {total_reminders_sent} pengingat terkirim. ---")
+    print(f"--- [Scheduled Task] Selesai. {stats['sent']} terkirim, {stats['failed']} gagal, {stats['batches']} batch. ---")
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -243,6 +805,10 @@ class User(db.Model, UserMixin):
     def check_password(self, password): return bcrypt.check_password_hash(self.password_hash, password)
 
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_archived_start', 'is_archived', 'tgl_mulai_event'),
+        db.Index('ix_event_start', 'tgl_mulai_event'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sifat_pelatihan = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(150), nullable=False)
@@ -263,9 +829,122 @@ class Event(db.Model):
     online_event_url = db.Column(db.String(500), nullable=True)
     has_pre_post_test = db.Column(db.Boolean, default=False)
     is_post_test_open_manually = db.Column(db.Boolean, default=False)
+    registered_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    checked_in_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Diperbarui hanya saat field yang tampil di daftar tiket berubah (lihat touch_event_listing),
+    # bukan oleh UPDATE counter saat registrasi/check-in, agar ETag daftar tiket tetap stabil.
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Naik setiap soal disimpan/dihapus; kunci cache soal di semua proses (get_event_question_set).
+    questions_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     questions = db.relationship('EventQuestion', backref='event', lazy='dynamic', cascade="all, delete-orphan")
+
+# Index pencarian event (judul, narasumber, PIC, deskripsi). PostgreSQL: kolom tsvector
+# yang diisi trigger + GIN, dan index trigram judul (pg_trgm) untuk kecocokan sebagian/typo.
+# SQLite: tabel FTS5 external-content yang disinkronkan oleh trigger.
+EVENT_SEARCH_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS event_search USING fts5("
+    "title, narasumber, pic_event, description, content='event', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS event_search_ai AFTER INSERT ON event BEGIN "
+    "INSERT INTO event_search(rowid, title, narasumber, pic_event, description) "
+    "VALUES (new.id, new.title, new.narasumber, new.pic_event, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS event_search_ad AFTER DELETE ON event BEGIN "
+    "INSERT INTO event_search(event_search, rowid, title, narasumber, pic_event, description) "
+    "VALUES ('delete', old.id, old.title, old.narasumber, old.pic_event, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS event_search_au AFTER UPDATE OF title, narasumber, pic_event, description ON event BEGIN "
+    "INSERT INTO event_search(event_search, rowid, title, narasumber, pic_event, description) "
+    "VALUES ('delete', old.id, old.title, old.narasumber, old.pic_event, old.description); "
+    "INSERT INTO event_search(rowid, title, narasumber, pic_event, description) "
+    "VALUES (new.id, new.title, new.narasumber, new.pic_event, new.description); END",
+    "INSERT INTO event_search(event_search) VALUES ('rebuild')",
+]
+# PostgreSQL: kolom tsvector biasa (nullable, tanpa rewrite tabel) yang diisi trigger, agar bisa
+# ditambahkan ke tabel yang sedang dipakai; baris lama di-backfill bertahap oleh migrasi 0003.
+EVENT_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}narasumber, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce({row}pic_event, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce({row}description, '')), 'C')"
+)
+EVENT_SEARCH_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE OR REPLACE FUNCTION event_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN NEW.search_vector := " + EVENT_SEARCH_VECTOR_SQL.format(row='NEW.') + "; RETURN NEW; END $$",
+    "DROP TRIGGER IF EXISTS event_search_vector_update ON event",
+    "CREATE TRIGGER event_search_vector_update BEFORE INSERT OR UPDATE OF title, narasumber, pic_event, description "
+    "ON event FOR EACH ROW EXECUTE PROCEDURE event_search_vector_update()",
+]
+# (nama index, kolom/opclass) untuk GIN; dibuat CONCURRENTLY oleh migrasi pada tabel yang berisi.
+EVENT_SEARCH_POSTGRES_INDEXES = [
+    ('ix_event_search_vector', [('search_vector', None)]),
+    ('ix_event_title_trgm', [('title', 'gin_trgm_ops')]),
+]
+
+def create_event_search_index(connection):
+    """
+    Membuat index pencarian event pada tabel baru (create_all); idempoten. Untuk database
+    yang sudah berisi, migrasi 0003 memakai langkah yang sama tetapi backfill bertahap
+    dan index CONCURRENTLY.
+    """
+    if connection.dialect.name == 'sqlite':
+        for statement in EVENT_SEARCH_SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+    elif connection.dialect.name == 'postgresql':
+        for statement in EVENT_SEARCH_POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+        for index_name, columns in EVENT_SEARCH_POSTGRES_INDEXES:
+            column_list = ', '.join(f"{column} {opclass}" if opclass else column for column, opclass in columns)
+            connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {index_name} ON event USING GIN ({column_list})")
+
+@db.event.listens_for(Event.__table__, 'after_create')
+def create_event_search_on_create(target, connection, **kw):
+    create_event_search_index(connection)
+
+@db.event.listens_for(Event.__table__, 'before_drop')
+def drop_event_search_on_drop(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for trigger in ['event_search_ai', 'event_search_ad', 'event_search_au']:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS event_search")
+
+def search_events(query, search):
+    """
+    Memfilter query Event dengan index pencarian dan mengurutkan berdasarkan relevansi.
+    Setiap kata dicocokkan sebagai prefix ('digi mark' menemukan 'Digital Marketing').
+    Mengembalikan (query, ranked); ranked False bila tidak ada kata yang bisa dicari.
+    """
+    terms = re.findall(r'\w+', search.lower())
+    if not terms:
+        return query, False
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        vector = db.literal_column('event.search_vector')
+        tsquery = db.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        phrase = ' '.join(terms)
+        rank = db.func.ts_rank(vector, tsquery) + db.func.word_similarity(phrase, Event.title)
+        query = query.filter(db.or_(vector.op('@@')(tsquery), db.literal(phrase).op('<%')(Event.title)))
+        return query.order_by(rank.desc(), Event.tgl_mulai_event.asc(), Event.id.asc()), True
+
+    if dialect == 'sqlite':
+        matches = db.text(
+            "SELECT rowid AS event_id, bm25(event_search, 10.0, 5.0, 5.0, 1.0) AS rank "
+            "FROM event_search WHERE event_search MATCH :match"
+        ).bindparams(match=' '.join(f'"{term}"*' for term in terms)).columns(
+            event_id=db.Integer, rank=db.Float
+        ).subquery()
+        query = query.join(matches, matches.c.event_id == Event.id)
+        return query.order_by(matches.c.rank.asc(), Event.tgl_mulai_event.asc(), Event.id.asc()), True
+
+    for term in terms:
+        pattern = f'%{term}%'
+        query = query.filter(db.or_(Event.title.ilike(pattern), Event.narasumber.ilike(pattern),
+                                    Event.pic_event.ilike(pattern), Event.description.ilike(pattern)))
+    return query, False
     
 class EventQuestion(db.Model):
+    __table_args__ = (db.Index('ix_event_question_event_number', 'event_id', 'question_number'),)
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
     question_number = db.Column(db.Integer, nullable=False)
@@ -277,6 +956,7 @@ class EventQuestion(db.Model):
     correct_answer = db.Column(db.String(1), nullable=False)
 
 class UserTestScore(db.Model):
+    __table_args__ = (db.Index('ix_user_test_score_user_event', 'user_id', 'event_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
@@ -288,6 +968,10 @@ class UserTestScore(db.Model):
     event = db.relationship('Event', backref=db.backref('test_scores', lazy=True))
 
 class Ticket(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'event_id', name='uq_ticket_user_event'),
+        db.Index('ix_ticket_event_checked', 'event_id', 'is_checked_in'),
+    )
     id = db.Column(db.Integer, primary_key=True); ticket_code = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
@@ -296,13 +980,13 @@ class Ticket(db.Model):
     event = db.relationship('Event', backref=db.backref('tickets', lazy=True))
 
 class CheckIn(db.Model):
-    id = db.Column(db.Integer, primary_key=True); ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    id = db.Column(db.Integer, primary_key=True); ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False, index=True)
     timestamp = db.Column(db.DateTime, nullable=False)
     ticket = db.relationship('Ticket', backref=db.backref('check_ins', lazy=True, cascade="all, delete-orphan"))
 
 class BusinessProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     
     business_name = db.Column(db.String(150), nullable=False)
     business_type = db.Column(db.String(100), nullable=False) 
@@ -340,19 +1024,19 @@ class BusinessProfile(db.Model):
 
 class BusinessMarketplace(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False, index=True)
     marketplace_type = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(255), nullable=False)
 
 class BusinessLicense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False, index=True)
     license_type = db.Column(db.String(100), nullable=False)
     license_number = db.Column(db.String(100), nullable=True)
 
 class BusinessFinance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False, index=True)
     year = db.Column(db.String(4), nullable=False)
     omzet_range = db.Column(db.String(100), nullable=False)
     profit = db.Column(db.BigInteger, nullable=True)
@@ -361,7 +1045,7 @@ class BusinessFinance(db.Model):
 
 class BusinessNPWP(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False, index=True)
     npwp_number = db.Column(db.String(100), nullable=True)
     report_receipt_number = db.Column(db.String(100), nullable=True)
     year = db.Column(db.String(4), nullable=True)
@@ -369,7 +1053,7 @@ class BusinessNPWP(db.Model):
 
 class BusinessFunding(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False, index=True)
     funder_type = db.Column(db.String(100), nullable=True)
     funder_name = db.Column(db.String(100), nullable=True)
     amount = db.Column(db.BigInteger, nullable=True)
@@ -377,12 +1061,363 @@ class BusinessFunding(db.Model):
     installment_start_date = db.Column(db.String(50), nullable=True)
     duration_months = db.Column(db.Integer, nullable=True)
 
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def queue_identity_invalidation(mapper, connection, target):
+    """Perubahan user (profil, role, fcm_token) membuang cache identitasnya setelah commit."""
+    db.session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_identities(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user_identity(user_id)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_identity_invalidations(session):
+    session.info.pop('changed_user_ids', None)
+
+@db.event.listens_for(Ticket, 'after_delete')
+def decrement_event_counters(mapper, connection, target):
+    """Menjaga counter Event tetap benar saat tiket dihapus lewat ORM (termasuk cascade)."""
+    values = {'registered_count': Event.__table__.c.registered_count - 1}
+    if target.is_checked_in:
+        values['checked_in_count'] = Event.__table__.c.checked_in_count - 1
+    connection.execute(Event.__table__.update().where(Event.__table__.c.id == target.event_id).values(**values))
+
+def reserve_event_slot(event_id):
+    """
+    Reservasi kuota atomik: UPDATE bersyarat registered_count < slot_peserta.
+    Hanya baris event itu yang terkunci (sampai commit), jadi request ke event lain
+    tidak ikut antre. Mengembalikan False bila kuota sudah penuh.
+    """
+    reserved = Event.query.filter(
+        Event.id == event_id, Event.registered_count < Event.slot_peserta
+    ).update({Event.registered_count: Event.registered_count + 1}, synchronize_session=False)
+    return reserved == 1
+
+def claim_ticket_check_in(ticket_id, event_id, timestamp=None):
+    """
+    Check-in atomik: UPDATE bersyarat (is_checked_in = False) sehingga dua scan bersamaan
+    tidak bisa sama-sama berhasil. Jika berhasil, mencatat CheckIn dan menaikkan
+    checked_in_count event. Mengembalikan False bila tiket sudah dipakai / tidak ada.
+    """
+    claimed = Ticket.query.filter_by(id=ticket_id, is_checked_in=False).update(
+        {Ticket.is_checked_in: True}, synchronize_session=False
+    )
+    if not claimed:
+        return False
+    db.session.add(CheckIn(ticket_id=ticket_id, timestamp=timestamp or datetime.utcnow()))
+    Event.query.filter_by(id=event_id).update(
+        {Event.checked_in_count: Event.checked_in_count + 1}, synchronize_session=False
+    )
+    return True
+
+def mark_ticket_checked_in(ticket, timestamp=None):
+    """Versi claim_ticket_check_in untuk objek Ticket yang sudah dimuat."""
+    claimed = claim_ticket_check_in(ticket.id, ticket.event_id, timestamp)
+    if claimed:
+        set_committed_value(ticket, 'is_checked_in', True)
+    return claimed
+
+TICKET_WAIT_MAX_SECONDS = 25
+TICKET_WAIT_RECHECK_SECONDS = 5
+TICKET_WAIT_BUSY_RETRY_SECONDS = 3
+
+_ticket_wait_slots = threading.BoundedSemaphore(app.config['TICKET_WAIT_MAX_WAITERS'])
+
+_ticket_waiters = {}
+_ticket_waiters_lock = threading.Lock()
+
+def notify_ticket_checked_in(ticket_code):
+    """Membangunkan semua long-poll yang sedang menunggu tiket ini di proses yang sama."""
+    with _ticket_waiters_lock:
+        waiter = _ticket_waiters.pop(ticket_code, None)
+    if waiter:
+        waiter[0].set()
+
+def wait_for_ticket_notification(ticket_code, timeout):
+    """Menunggu notifikasi check-in hingga `timeout` detik. True jika dibangunkan."""
+    with _ticket_waiters_lock:
+        waiter = _ticket_waiters.setdefault(ticket_code, [threading.Event(), 0])
+        waiter[1] += 1
+    try:
+        return waiter[0].wait(timeout)
+    finally:
+        with _ticket_waiters_lock:
+            waiter[1] -= 1
+            if waiter[1] == 0 and _ticket_waiters.get(ticket_code) is waiter:
+                del _ticket_waiters[ticket_code]
+
+SCANNER_INDEX_TTL = timedelta(hours=12)
+
+# Index tiket per event untuk scanner: {event_id: {'title', 'warmed_at', 'tickets'}}.
+# 'tickets' berisi ticket_code -> (ticket_id, user_name, user_email, is_checked_in, checked_in_at).
+_scanner_indexes = {}
+_scanner_indexes_warming = set()
+_scanner_indexes_lock = threading.Lock()
+
+def warm_scanner_index(event):
+    """Memuat semua tiket sebuah event ke memori dengan satu query (dipanggil saat scanner dibuka)."""
+    rows = db.session.query(
+        Ticket.ticket_code, Ticket.id, User.name, User.email, Ticket.is_checked_in, CheckIn.timestamp
+    ).join(User, Ticket.user_id == User.id).outerjoin(CheckIn, CheckIn.ticket_id == Ticket.id).filter(
+        Ticket.event_id == event.id
+    ).all()
+
+    tickets = {}
+    for code, ticket_id, name, email, is_checked_in, checked_in_at in rows:
+        tickets.setdefault(code, (ticket_id, name, email, bool(is_checked_in), checked_in_at))
+
+    now = datetime.utcnow()
+    with _scanner_indexes_lock:
+        for stale_id in [k for k, v in _scanner_indexes.items() if now - v['warmed_at'] > SCANNER_INDEX_TTL]:
+            del _scanner_indexes[stale_id]
+        _scanner_indexes[event.id] = {'title': event.title, 'warmed_at': now, 'tickets': tickets}
+    return len(tickets)
+
+def schedule_scanner_index_warm(event_id):
+    """
+    Warm index event di thread latar setelah scan lewat jalur database (mis. app mobile yang
+    tidak membuka halaman scanner), agar request scan tidak ikut memuat semua tiket event.
+    Cek & klaim dilakukan di bawah lock, jadi scan pertama yang bersamaan hanya memicu satu warm.
+    """
+    with _scanner_indexes_lock:
+        if event_id in _scanner_indexes or event_id in _scanner_indexes_warming:
+            return False
+        _scanner_indexes_warming.add(event_id)
+    threading.Thread(target=run_scanner_index_warm, args=(event_id,), name='scanner-warm', daemon=True).start()
+    return True
+
+def run_scanner_index_warm(event_id):
+    try:
+        with app.app_context():
+            event = db.session.get(Event, event_id)
+            if event:
+                warm_scanner_index(event)
+    except Exception as e:
+        print(f"Gagal warm index scanner event {event_id}: {e}")
+    finally:
+        with _scanner_indexes_lock:
+            _scanner_indexes_warming.discard(event_id)
+
+def find_scanner_ticket(ticket_code, event_id=None):
+    """Mencari tiket di index yang sudah di-warm. Mengembalikan (event_id, event_title, entry) atau None."""
+    with _scanner_indexes_lock:
+        candidates = [event_id] if event_id is not None else list(_scanner_indexes)
+        for candidate_id in candidates:
+            index = _scanner_indexes.get(candidate_id)
+            entry = index['tickets'].get(ticket_code) if index else None
+            if entry:
+                return candidate_id, index['title'], entry
+    return None
+
+def update_scanner_entry(event_id, ticket_code, entry):
+    with _scanner_indexes_lock:
+        index = _scanner_indexes.get(event_id)
+        if index is None:
+            return
+        if entry is None:
+            index['tickets'].pop(ticket_code, None)
+        else:
+            index['tickets'][ticket_code] = entry
+
+def scanner_index_check_in(ticket_code, event_id=None):
+    """
+    Jalur cepat scanner: validasi dari index memori, hanya penulisan check-in yang ke database.
+    Mengembalikan None jika tiket tidak ada di index (pemanggil lanjut ke jalur database),
+    atau (event_id, event_title, entry, claimed).
+    """
+    hit = find_scanner_ticket(ticket_code, event_id)
+    if not hit:
+        return None
+    event_id, event_title, entry = hit
+    ticket_id, name, email, is_checked_in, checked_in_at = entry
+    if is_checked_in:
+        return event_id, event_title, entry, False
+
+    now = datetime.utcnow()
+    claimed = claim_ticket_check_in(ticket_id, event_id, now)
+    db.session.commit()
+
+    if claimed:
+        entry = (ticket_id, name, email, True, now)
+        notify_ticket_checked_in(ticket_code)
+    else:
+        # Index basi: tiket sudah di-check-in worker lain, atau sudah dihapus.
+        if db.session.query(Ticket.id).filter_by(id=ticket_id).scalar() is None:
+            update_scanner_entry(event_id, ticket_code, None)
+            return None
+        checked_in_at = db.session.query(CheckIn.timestamp).filter_by(ticket_id=ticket_id).scalar()
+        entry = (ticket_id, name, email, True, checked_in_at)
+    update_scanner_entry(event_id, ticket_code, entry)
+    return event_id, event_title, entry, claimed
+
+def recount_event_counters():
+    """Menghitung ulang registered_count & checked_in_count semua event dalam satu UPDATE."""
+    registered = db.select(db.func.count(Ticket.id)).where(Ticket.event_id == Event.id).scalar_subquery()
+    checked_in = db.select(db.func.count(Ticket.id)).where(
+        Ticket.event_id == Event.id, Ticket.is_checked_in == True
+    ).scalar_subquery()
+    result = db.session.execute(
+        db.update(Event).values(registered_count=registered, checked_in_count=checked_in),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
+
+class OutboundEmail(db.Model):
+    __table_args__ = (db.Index('ix_outbound_email_due', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+MAIL_QUEUE_POLL_SECONDS = 5
+MAIL_QUEUE_LEASE = timedelta(minutes=5)
+
+_mail_worker_wakeup = threading.Event()
+_mail_worker_lock = threading.Lock()
+_mail_worker_thread = None
+
+def enqueue_email(recipient, subject, html=None, body=None):
+    """
+    Menaruh email di antrean (tabel outbound_email) dalam transaksi yang sedang berjalan.
+    Email benar-benar dikirim oleh background sender setelah transaksi di-commit.
+    """
+    email = OutboundEmail(recipient=recipient, subject=subject, html=html, body=body, next_attempt_at=datetime.utcnow())
+    db.session.add(email)
+    db.session.info['mail_enqueued'] = True
+    start_mail_worker()
+    return email
+
+@db.event.listens_for(db.session, 'after_commit')
+def wake_mail_worker(session):
+    if session.info.pop('mail_enqueued', False):
+        _mail_worker_wakeup.set()
+
+def mail_retry_delay(attempts):
+    """Backoff eksponensial: 30 dtk, 1, 2, 4, ... menit, maksimal 1 jam."""
+    return timedelta(seconds=min(30 * (2 ** max(attempts - 1, 0)), 3600))
+
+def claim_due_emails(limit):
+    """
+    Mengklaim email yang jatuh tempo dengan UPDATE bersyarat, sehingga beberapa
+    worker/proses tidak mengirim email yang sama. Klaim berlaku selama MAIL_QUEUE_LEASE;
+    jika proses mati di tengah jalan, email otomatis jatuh tempo lagi.
+    """
+    now = datetime.utcnow()
+    candidate_ids = [row[0] for row in db.session.query(OutboundEmail.id).filter(
+        OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now
+    ).order_by(OutboundEmail.next_attempt_at).limit(limit)]
+
+    claimed = []
+    for email_id in candidate_ids:
+        updated = OutboundEmail.query.filter(
+            OutboundEmail.id == email_id, OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now
+        ).update({
+            OutboundEmail.next_attempt_at: now + MAIL_QUEUE_LEASE,
+            OutboundEmail.attempts: OutboundEmail.attempts + 1
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(email_id)
+    db.session.commit()
+    return OutboundEmail.query.filter(OutboundEmail.id.in_(claimed)).order_by(OutboundEmail.id).all() if claimed else []
+
+def process_mail_queue(limit=None):
+    """Mengirim satu batch email dari antrean lewat SATU koneksi SMTP. Mengembalikan (terkirim, gagal)."""
+    emails = claim_due_emails(limit or app.config['MAIL_QUEUE_BATCH_SIZE'])
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        with mail.connect() as conn:
+            for email in emails:
+                try:
+                    conn.send(Message(subject=email.subject, recipients=[email.recipient], html=email.html, body=email.body))
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                    sent += 1
+                except Exception as e:
+                    schedule_mail_retry(email, e)
+                    failed += 1
+        record_outbound_call('smtp', 'success', {'sent': sent, 'failed': failed})
+    except Exception as e:
+        # Koneksi SMTP gagal dibuka: semua email di batch dijadwalkan ulang.
+        for email in emails:
+            if email.status != 'sent':
+                schedule_mail_retry(email, e)
+                failed += 1
+        record_outbound_call('smtp', 'error', {'sent': sent, 'failed': failed})
+    db.session.commit()
+    print(f"Mail queue: {sent} email terkirim, {failed} dijadwalkan ulang/gagal.")
+    return sent, failed
+
+def schedule_mail_retry(email, error):
+    email.last_error = str(error)
+    if email.attempts >= app.config['MAIL_QUEUE_MAX_ATTEMPTS']:
+        email.status = 'failed'
+    else:
+        email.next_attempt_at = datetime.utcnow() + mail_retry_delay(email.attempts)
+
+def run_mail_worker():
+    while True:
+        _mail_worker_wakeup.wait(MAIL_QUEUE_POLL_SECONDS)
+        _mail_worker_wakeup.clear()
+        with app.app_context():
+            try:
+                while process_mail_queue() != (0, 0):
+                    pass
+            except Exception as e:
+                db.session.rollback()
+                print(f"Mail worker error: {e}")
+            finally:
+                db.session.remove()
+
+def start_mail_worker():
+    """Menyalakan background sender (sekali per proses) bila MAIL_QUEUE_WORKER aktif."""
+    global _mail_worker_thread
+    if not app.config['MAIL_QUEUE_WORKER']:
+        return
+    with _mail_worker_lock:
+        if _mail_worker_thread is None or not _mail_worker_thread.is_alive():
+            _mail_worker_thread = threading.Thread(target=run_mail_worker, name='mail-queue', daemon=True)
+            _mail_worker_thread.start()
+            # Putaran pertama langsung jalan: kirim sisa antrean/lease kedaluwarsa dari sebelum restart.
+            _mail_worker_wakeup.set()
+
+@app.before_request
+def ensure_mail_worker():
+    """Sender dinyalakan pada request pertama tiap proses, tidak menunggu ada email baru masuk antrean."""
+    if _mail_worker_thread is None or not _mail_worker_thread.is_alive():
+        start_mail_worker()
+
+@app.cli.command("send-mail")
+@click.option('--loop', is_flag=True, help='Terus berjalan sebagai worker antrean email.')
+def send_mail_command(loop):
+    """Mengirim email yang menunggu di antrean (untuk cron atau proses worker terpisah)."""
+    while True:
+        while process_mail_queue() != (0, 0):
+            pass
+        if not loop:
+            break
+        _mail_worker_wakeup.wait(MAIL_QUEUE_POLL_SECONDS)
+        _mail_worker_wakeup.clear()
+
 def generate_otp(length=6):
     """Generate a random numeric OTP."""
     return ''.join(random.choices(string.digits, k=length))
 
 def send_verification_email(user_email, otp_code):
-    """Sends an email with the OTP code using Flask-Mail."""
+    """Queues an email with the OTP code; it is delivered by the mail queue sender."""
     
     html_content = f"""
     <div style="font-family: Arial, sans-serif; line-height: 1.6;">
@@ -400,21 +1435,20 @@ def send_verification_email(user_email, otp_code):
     """
     
     try:
-        msg = Message(
+        enqueue_email(
+            recipient=user_email,
             subject="Kode Verifikasi Akun OK OCE Anda",
-            recipients=[user_email],
-            html=html_content, 
+            html=html_content,
             body=f"Kode verifikasi Anda adalah: {otp_code}"
         )
-        mail.send(msg)
-        print(f"Email verifikasi berhasil dikirim ke {user_email} via Gmail.")
+        print(f"Email verifikasi untuk {user_email} masuk antrean.")
         return True
     except Exception as e:
-        print(f"Error sending email: {e}")
+        print(f"Error queueing email: {e}")
         return False
 
 def send_password_reset_email(user_email, otp_code):
-    """Sends a password reset OTP code using Flask-Mail."""
+    """Queues a password reset OTP code; it is delivered by the mail queue sender."""
     
     html_content = f"""
     <div style="font-family: Arial, sans-serif; line-height: 1.6;">
@@ -433,28 +1467,95 @@ def send_password_reset_email(user_email, otp_code):
     """
 
     try:
-        msg = Message(
+        enqueue_email(
+            recipient=user_email,
             subject="Kode Reset Password OK OCE Anda",
-            recipients=[user_email],
-            html=html_content, 
-            body=f"Kode reset password Anda adalah: {otp_code}" 
+            html=html_content,
+            body=f"Kode reset password Anda adalah: {otp_code}"
         )
-        mail.send(msg)
-        print(f"Email reset password berhasil dikirim ke {user_email} via Gmail.")
+        print(f"Email reset password untuk {user_email} masuk antrean.")
         return True
     except Exception as e:
-        print(f"Error sending email: {e}")
+        print(f"Error queueing email: {e}")
         return False
 
+EVENT_PAGE_MAX = 100
+EVENT_COUNT_CACHE_TTL = 60
+
+_event_count_cache = {}
+_event_count_cache_lock = threading.Lock()
+
+def encode_event_cursor(event):
+    """Cursor opaque (tgl_mulai_event, id) untuk pagination keyset."""
+    raw = json.dumps([event.tgl_mulai_event.isoformat(), event.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_event_cursor(token):
+    """Mengembalikan (tgl_mulai_event, id), atau None bila token tidak valid."""
+    try:
+        start, event_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return datetime.fromisoformat(start), int(event_id)
+    except (ValueError, TypeError):
+        return None
+
+def keyset_events(query, limit, after=None, before=None):
+    """
+    Satu halaman event urut (tgl_mulai_event, id) ASC tanpa OFFSET maupun COUNT:
+    ambil limit+1 baris setelah (atau sebelum) cursor untuk tahu masih ada halaman lain.
+    """
+    key = db.tuple_(Event.tgl_mulai_event, Event.id)
+    if before:
+        rows = query.filter(key < db.tuple_(*before)).order_by(
+            Event.tgl_mulai_event.desc(), Event.id.desc()
+        ).limit(limit + 1).all()
+        items = list(reversed(rows[:limit]))
+        has_prev, has_next = len(rows) > limit, True
+    else:
+        if after:
+            query = query.filter(key > db.tuple_(*after))
+        rows = query.order_by(Event.tgl_mulai_event.asc(), Event.id.asc()).limit(limit + 1).all()
+        items = rows[:limit]
+        has_prev, has_next = after is not None, len(rows) > limit
+    return {
+        'items': items,
+        'has_next': has_next and bool(items),
+        'has_prev': has_prev and bool(items),
+        'next_cursor': encode_event_cursor(items[-1]) if items and has_next else None,
+        'prev_cursor': encode_event_cursor(items[0]) if items and has_prev else None,
+    }
+
+def cached_event_count(cache_key, query):
+    """COUNT(*) event yang di-cache per proses (TTL), dikosongkan saat ada event dibuat/diubah/dihapus."""
+    now = monotonic()
+    with _event_count_cache_lock:
+        entry = _event_count_cache.get(cache_key)
+        if entry and entry[0] > now:
+            return entry[1]
+    total = query.order_by(None).count()
+    with _event_count_cache_lock:
+        _event_count_cache[cache_key] = (now + EVENT_COUNT_CACHE_TTL, total)
+    return total
+
+@db.event.listens_for(Event, 'after_insert')
+@db.event.listens_for(Event, 'after_update')
+@db.event.listens_for(Event, 'after_delete')
+def clear_event_count_cache(mapper, connection, target):
+    with _event_count_cache_lock:
+        _event_count_cache.clear()
+
 @app.route('/api/public/events', methods=['GET'])
 def public_get_events():
     """
     Endpoint PUBLIK untuk mengambil daftar event aktif.
-    Support Pagination: ?page=1&limit=10
+    Pagination keyset: ?limit=10&cursor=<meta.next_cursor>; tambahkan ?include_total=1
+    untuk jumlah total (di-cache). ?page=N (offset) masih didukung untuk klien lama.
     """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 10, type=int)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), EVENT_PAGE_MAX)
+        cursor = request.args.get('cursor')
+        after = decode_event_cursor(cursor) if cursor else None
+        if cursor and not after:
+            return jsonify({'status': 'error', 'message': 'Cursor tidak valid'}), 400
         
         now_utc = datetime.utcnow()
         
@@ -462,13 +1563,28 @@ def public_get_events():
             Event.jenis_event == 'Public', 
             Event.is_archived == False,
             Event.tgl_selesai_event > now_utc
-        ).order_by(Event.tgl_mulai_event.asc())
+        )
         
-        pagination = query.paginate(page=page, per_page=limit, error_out=False)
-        events = pagination.items
+        if 'page' in request.args and not cursor:
+            page = request.args.get('page', 1, type=int)
+            pagination = query.order_by(Event.tgl_mulai_event.asc(), Event.id.asc()).paginate(page=page, per_page=limit, error_out=False)
+            events = pagination.items
+            meta = {
+                'current_page': page,
+                'per_page': limit,
+                'total_events': pagination.total,
+                'total_pages': pagination.pages
+            }
+        else:
+            page = keyset_events(query, limit, after=after)
+            events = page['items']
+            meta = {'per_page': limit, 'next_cursor': page['next_cursor'], 'has_more': page['has_next']}
+            if request.args.get('include_total', type=int):
+                meta['total_events'] = cached_event_count('public', query)
         
         results = []
         for e in events:
+            posters = poster_urls(e.image_filename)
             dt_aware_utc = pytz.utc.localize(e.tgl_mulai_event)
             dt_aware_wib = dt_aware_utc.astimezone(LOCAL_TZ)
             
@@ -479,19 +1595,15 @@ def public_get_events():
                 'start_time': dt_aware_wib.isoformat(),
                 'location': e.tempat_event,
                 'price': e.price,
-                'image_url': f"{request.host_url}uploads/{e.image_filename}" if e.image_filename else None,
+                'image_url': posters['card'] if posters else None,
+                'image_variants': posters,
                 'registration_open': e.tgl_buka_pendaftaran <= now_utc <= e.tgl_tutup_pendaftaran
             })
             
         return jsonify({
             'status': 'success',
             'data': results,
-            'meta': {
-                'current_page': page,
-                'per_page': limit,
-                'total_events': pagination.total,
-                'total_pages': pagination.pages
-            }
+            'meta': meta
         }), 200
 
     except Exception as e:
@@ -558,8 +1670,8 @@ def api_login():
             user.verification_otp = otp
             user.otp_expiry = datetime.utcnow() + timedelta(minutes=10)
             user.last_otp_sent = datetime.utcnow()
-            db.session.commit()
             send_verification_email(user.email, otp)
+            db.session.commit()
             
             return jsonify({
                 'message': 'Akun Anda belum terverifikasi. Kami telah mengirim ulang kode OTP ke email Anda.',
@@ -620,11 +1732,12 @@ def send_password_reset_otp():
         otp = generate_otp()
         user.verification_otp = otp
         user.otp_expiry = datetime.utcnow() + timedelta(minutes=10)
-        db.session.commit()
         
         if send_password_reset_email(user.email, otp):
+            db.session.commit()
             return jsonify({'message': 'OTP reset password telah dikirim ke email Anda'}), 200
         else:
+            db.session.rollback()
             return jsonify({'message': 'Gagal mengirim email'}), 500
     else:
         return jsonify({'message': 'Email tidak terdaftar'}), 404
@@ -733,7 +1846,8 @@ def update_fcm_token():
         return jsonify(message="Token required"), 400
 
     try:
-        current_user.fcm_token = token
+        user = db.session.get(User, current_user.id)
+        user.fcm_token = token
         db.session.commit()
         return jsonify(message="Token updated"), 200
     except Exception as e:
@@ -763,10 +1877,12 @@ def get_events():
     
     event_list = []
     for e in visible_events:
+        posters = poster_urls(e.image_filename)
         event_data = { 
             'id': e.id, 'title': e.title, 'description': e.description, 
             'date': e.tgl_mulai_event.strftime('%d %B %Y'), 'location': e.tempat_event, 
             'price': e.price, 'image_filename': e.image_filename, 
+            'image_url': posters['card'] if posters else None, 'image_variants': posters, 
             'tgl_buka_pendaftaran': e.tgl_buka_pendaftaran.isoformat() if e.tgl_buka_pendaftaran else None, 
             'tgl_tutup_pendaftaran': e.tgl_tutup_pendaftaran.isoformat() if e.tgl_tutup_pendaftaran else None,
             'is_umkm_data_required': e.is_umkm_data_required
@@ -795,38 +1911,92 @@ def buy_ticket():
     if now_aware < buka_pendaftaran_aware: return jsonify({'message': 'Pendaftaran belum dibuka.'}), 409
     if now_aware > tutup_pendaftaran_aware: return jsonify({'message': 'Pendaftaran sudah ditutup.'}), 409
 
-    ticket_count = Ticket.query.filter_by(event_id=event_id).count()
-    if ticket_count >= event.slot_peserta: return jsonify({'message': 'Kuota penuh.'}), 409
+    if event.registered_count >= event.slot_peserta: return jsonify({'message': 'Kuota penuh.'}), 409
 
     if event.is_umkm_data_required:
         business_count = BusinessProfile.query.filter_by(user_id=user_id).count()
         if business_count == 0:
             return jsonify({'message': 'Event ini mewajibkan Anda melengkapi data UMKM. Silakan isi di menu Profil.'}), 409
 
-    new_ticket = Ticket(user_id=user_id, event_id=event_id)
-    db.session.add(new_ticket); db.session.commit()
+    if not reserve_event_slot(event.id):
+        db.session.rollback()
+        return jsonify({'message': 'Kuota penuh.'}), 409
+
+    new_ticket = Ticket(user_id=user_id, event_id=event.id)
+    db.session.add(new_ticket)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Anda sudah terdaftar di event ini.'}), 409
     return jsonify({'message': 'Tiket berhasil dibeli', 'ticket_code': new_ticket.ticket_code}), 201
 
+TICKET_LIST_EVENT_FIELDS = ('title', 'tgl_mulai_event', 'tempat_event', 'has_pre_post_test')
+
+@db.event.listens_for(Event, 'before_update')
+def touch_event_listing(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TICKET_LIST_EVENT_FIELDS):
+        target.updated_at = datetime.utcnow()
+
+def user_tickets_version(user_id):
+    """
+    Versi daftar tiket user dari SATU query agregat: jumlah & id tiket terakhir, check-in,
+    submit test, dan perubahan event terakhir. Dipakai untuk ETag/Last-Modified.
+    Check-in & nilai juga dihitung jumlahnya, bukan hanya waktu terakhirnya: batch offline
+    menyimpan waktu scan asli, yang bisa lebih lama dari check-in terakhir.
+    """
+    version = db.session.query(
+        db.func.count(db.distinct(Ticket.id)),
+        db.func.max(Ticket.id),
+        db.func.max(CheckIn.timestamp),
+        db.func.max(UserTestScore.pre_test_submitted_at),
+        db.func.max(UserTestScore.post_test_submitted_at),
+        db.func.max(Event.updated_at),
+        db.func.count(db.distinct(CheckIn.id)),
+        db.func.count(db.distinct(db.case((Ticket.is_checked_in == True, Ticket.id)))),
+        db.func.count(db.distinct(UserTestScore.id)),
+        db.func.sum(db.func.coalesce(UserTestScore.pre_test_score, -1) * 1000 + db.func.coalesce(UserTestScore.post_test_score, -1))
+    ).select_from(Ticket).join(Event, Ticket.event_id == Event.id).outerjoin(
+        CheckIn, CheckIn.ticket_id == Ticket.id
+    ).outerjoin(
+        UserTestScore, db.and_(UserTestScore.user_id == Ticket.user_id, UserTestScore.event_id == Ticket.event_id)
+    ).filter(Ticket.user_id == user_id).one()
+
+    etag = hashlib.sha1(repr(tuple(version)).encode('utf-8')).hexdigest()
+    timestamps = [value for value in version[2:6] if value is not None]
+    last_modified = pytz.utc.localize(max(timestamps)).replace(microsecond=0) if timestamps else None
+    return etag, last_modified
+
 @app.route('/api/users/<int:user_id>/tickets', methods=['GET'])
 @login_required
 def get_user_tickets(user_id):
     if user_id != current_user.id: return jsonify({"message": "Akses ditolak"}), 403
-    
-    tickets = Ticket.query.join(Event).filter(Ticket.user_id == user_id).order_by(Event.tgl_mulai_event.desc()).all()
-    
-    results = []
-    for t in tickets:
-        status = 'READY'
-        label = 'Tersedia'
+
+    etag, last_modified = user_tickets_version(user_id)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+    if not_modified:
+        response = Response(status=304)
+    else:
+        rows = db.session.query(Ticket, Event, UserTestScore).join(
+            Event, Ticket.event_id == Event.id
+        ).outerjoin(
+            UserTestScore, db.and_(UserTestScore.user_id == Ticket.user_id, UserTestScore.event_id == Ticket.event_id)
+        ).filter(Ticket.user_id == user_id).order_by(Event.tgl_mulai_event.desc()).all()
         
-        if t.is_checked_in:
-            if not t.event.has_pre_post_test:
-                status = 'DONE'
-                label = 'Selesai'
-            else:
-                score = UserTestScore.query.filter_by(user_id=user_id, event_id=t.event.id).first()
-                
-                if not score:
+        results = []
+        for t, event, score in rows:
+            status = 'READY'
+            label = 'Tersedia'
+            
+            if t.is_checked_in:
+                if not event.has_pre_post_test:
+                    status = 'DONE'
+                    label = 'Selesai'
+                elif not score:
                     status = 'PRE_TEST'
                     label = 'Isi Pre-Test'
                 elif score.post_test_score is None:
@@ -835,22 +2005,27 @@ def get_user_tickets(user_id):
                 else:
                     status = 'DONE'
                     label = 'Selesai'
-        
-        if not t.is_checked_in and t.event.tempat_event == 'Online':
-             label = 'Gabung Online'
-
-        results.append({
-            'ticket_code': t.ticket_code, 
-            'is_checked_in': t.is_checked_in, 
-            'event_title': t.event.title, 
-            'event_date': t.event.tgl_mulai_event.strftime('%d %B %Y'), 
-            'event_id': t.event.id,
-            'event_location': t.event.tempat_event,
-            'status': status,
-            'status_label': label
-        })
-        
-    return jsonify(results)
+            
+            if not t.is_checked_in and event.tempat_event == 'Online':
+                 label = 'Gabung Online'
+
+            results.append({
+                'ticket_code': t.ticket_code, 
+                'is_checked_in': t.is_checked_in, 
+                'event_title': event.title, 
+                'event_date': event.tgl_mulai_event.strftime('%d %B %Y'), 
+                'event_id': event.id,
+                'event_location': event.tempat_event,
+                'status': status,
+                'status_label': label
+            })
+        response = jsonify(results)
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/api/events/<int:event_id>/test/status', methods=['GET'])
 @login_required
@@ -897,22 +2072,13 @@ def get_test_status_api(event_id):
 @app.route('/api/events/<int:event_id>/test/questions', methods=['GET'])
 @login_required
 def get_test_questions_api(event_id):
-    questions = EventQuestion.query.filter_by(event_id=event_id).order_by(EventQuestion.question_number).all()
+    version = db.session.query(Event.questions_version).filter(Event.id == event_id).scalar()
+    question_set = get_event_question_set(event_id, version) if version is not None else None
     
-    if not questions:
+    if not question_set:
         return jsonify({'message': 'Soal belum dibuat oleh admin'}), 404
 
-    return jsonify([{
-        'id': q.id,
-        'number': q.question_number,
-        'text': q.question_text,
-        'options': {
-            'A': q.option_a,
-            'B': q.option_b,
-            'C': q.option_c,
-            'D': q.option_d
-        }
-    } for q in questions]), 200
+    return Response(question_set['payload'], status=200, mimetype=app.json.mimetype)
 
 @app.route('/api/events/<int:event_id>/test/submit', methods=['POST'])
 @login_required
@@ -920,20 +2086,16 @@ def submit_test_api(event_id):
     data = request.json
     user_answers = data.get('answers', {})
     
-    questions = EventQuestion.query.filter_by(event_id=event_id).all()
-    if not questions: return jsonify({'message': 'Error data soal'}), 500
+    # Versi soal dan nilai user diambil dalam satu query.
+    row = db.session.query(Event.questions_version, UserTestScore).outerjoin(
+        UserTestScore, db.and_(UserTestScore.event_id == Event.id, UserTestScore.user_id == current_user.id)
+    ).filter(Event.id == event_id).first()
+    question_set = get_event_question_set(event_id, row.questions_version) if row else None
+    if not question_set: return jsonify({'message': 'Error data soal'}), 500
 
-    correct_count = 0
-    total_questions = len(questions)
+    final_score = grade_test_answers(question_set['answer_key'], user_answers)
 
-    for q in questions:
-        ans = user_answers.get(str(q.question_number))
-        if ans and ans == q.correct_answer:
-            correct_count += 1
-    
-    final_score = int((correct_count / total_questions) * 100)
-
-    score_record = UserTestScore.query.filter_by(user_id=current_user.id, event_id=event_id).first()
+    score_record = row.UserTestScore
     
     test_type = 'Pre-Test'
     
@@ -1008,43 +2170,56 @@ def mobile_panitia_scan():
     
     if not ticket_code:
         return jsonify({'status': 'error', 'message': 'Kode tiket tidak terbaca'}), 400
-        
-    ticket = Ticket.query.filter_by(ticket_code=ticket_code).first()
-    
-    if not ticket:
-        return jsonify({'status': 'error', 'message': 'Tiket Tidak Valid / Tidak Ditemukan'}), 404
-        
-    if ticket.is_checked_in:
-        checker_name = "Panitia Sebelumnya"
-        check_in_data = CheckIn.query.filter_by(ticket_id=ticket.id).first()
-        time_str = check_in_data.timestamp.strftime('%H:%M') if check_in_data else "-"
-        
+
+    def used_response(user_name, event_title, checked_in_at):
+        time_str = checked_in_at.strftime('%H:%M') if checked_in_at else "-"
         return jsonify({
             'status': 'error',
             'message': f'Tiket SUDAH DIGUNAKAN pukul {time_str}',
             'detail': {
-                'user_name': ticket.user.name,
-                'event_title': ticket.event.title
+                'user_name': user_name,
+                'event_title': event_title
             }
         }), 409
-    
-    try:
-        ticket.is_checked_in = True
-        new_check_in = CheckIn(ticket_id=ticket.id, timestamp=datetime.utcnow())
-        db.session.add(new_check_in)
-        db.session.commit()
-        
+
+    def success_response(user_name, user_email, event_title):
         return jsonify({
             'status': 'success',
             'message': 'Check-in BERHASIL',
             'detail': {
-                'user_name': ticket.user.name, 
-                'user_email': ticket.user.email,
-                'event_title': ticket.event.title,
+                'user_name': user_name, 
+                'user_email': user_email,
+                'event_title': event_title,
                 'ticket_type': 'Reguler',
                 'check_in_time': datetime.now(LOCAL_TZ).strftime('%H:%M WIB')
             }
         }), 200
+
+    try:
+        indexed = scanner_index_check_in(ticket_code)
+        if indexed:
+            _, event_title, entry, claimed = indexed
+            _, user_name, user_email, _, checked_in_at = entry
+            if not claimed:
+                return used_response(user_name, event_title, checked_in_at)
+            return success_response(user_name, user_email, event_title)
+        
+        ticket = Ticket.query.filter_by(ticket_code=ticket_code).first()
+        
+        if not ticket:
+            return jsonify({'status': 'error', 'message': 'Tiket Tidak Valid / Tidak Ditemukan'}), 404
+            
+        if ticket.is_checked_in or not mark_ticket_checked_in(ticket):
+            db.session.rollback()
+            check_in_data = CheckIn.query.filter_by(ticket_id=ticket.id).first()
+            return used_response(ticket.user.name, ticket.event.title, check_in_data.timestamp if check_in_data else None)
+
+        db.session.commit()
+        notify_ticket_checked_in(ticket.ticket_code)
+
+        schedule_scanner_index_warm(ticket.event_id)
+        
+        return success_response(ticket.user.name, ticket.user.email, ticket.event.title)
         
     except Exception as e:
         db.session.rollback()
@@ -1059,6 +2234,19 @@ def check_in():
     
     if not ticket_code:
         return jsonify({'status': 'error', 'message': 'Kode tiket tidak ada'}), 400
+
+    if target_event_id and current_user.role in ['admin', 'panitia']:
+        indexed = scanner_index_check_in(ticket_code, int(target_event_id))
+        if indexed:
+            _, event_title, entry, claimed = indexed
+            if not claimed:
+                return jsonify({'status': 'error', 'message': 'Tiket Sudah Digunakan'}), 409
+            return jsonify({
+                'status': 'success', 
+                'message': 'Check-in Berhasil', 
+                'user_name': entry[1], 
+                'event_title': event_title
+            }), 200
         
     ticket = Ticket.query.filter_by(ticket_code=ticket_code).first()
     
@@ -1097,12 +2285,11 @@ def check_in():
     else:
         return jsonify({'status': 'error', 'message': 'Akses Ditolak'}), 403
 
-    ticket.is_checked_in = True
-    timestamp_wib = datetime.utcnow() 
-    new_check_in = CheckIn(ticket_id=ticket.id, timestamp=timestamp_wib)
-    
-    db.session.add(new_check_in)
+    if not mark_ticket_checked_in(ticket):
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'Tiket Sudah Digunakan'}), 409
     db.session.commit()
+    notify_ticket_checked_in(ticket.ticket_code)
     
     return jsonify({
         'status': 'success', 
@@ -1111,6 +2298,120 @@ def check_in():
         'event_title': event.title
     }), 200
 
+CHECKIN_BATCH_MAX = 1000
+
+def parse_scanned_at(value, now):
+    """ISO-8601 dari perangkat -> UTC naive. Naive dianggap UTC; kosong/invalid/masa depan -> now."""
+    if not value:
+        return now
+    try:
+        scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return now
+    if scanned_at.tzinfo is not None:
+        scanned_at = scanned_at.astimezone(pytz.utc).replace(tzinfo=None)
+    return min(scanned_at, now)
+
+@app.route('/api/checkin/batch', methods=['POST'])
+@login_required
+@role_required(['admin', 'panitia'])
+def batch_check_in():
+    """
+    Sinkronisasi antrean scan offline: {"event_id": opsional, "scans": [{"ticket_code", "scanned_at"}]}.
+    Semua scan diterapkan dalam satu transaksi dengan aturan yang sama seperti /api/checkin
+    dan /api/mobile/panitia/scan; waktu scan asli disimpan di CheckIn.timestamp.
+    Hasil per kode: ok / already_used / wrong_event / invalid.
+    """
+    data = request.json or {}
+    scans = data.get('scans') or []
+    target_event_id = data.get('event_id')
+
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'status': 'error', 'message': 'Daftar scan kosong'}), 400
+    if len(scans) > CHECKIN_BATCH_MAX:
+        return jsonify({'status': 'error', 'message': f'Maksimal {CHECKIN_BATCH_MAX} scan per batch'}), 400
+    if target_event_id:
+        try:
+            target_event_id = int(target_event_id)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'event_id tidak valid'}), 400
+
+    now = datetime.utcnow()
+    codes = {str(scan.get('ticket_code')) for scan in scans if isinstance(scan, dict) and scan.get('ticket_code')}
+    tickets = {}
+    if codes:
+        tickets = {
+            row.ticket_code: row for row in db.session.query(
+                Ticket.id, Ticket.ticket_code, Ticket.event_id, Ticket.is_checked_in, User.name
+            ).join(User, Ticket.user_id == User.id).filter(Ticket.ticket_code.in_(codes))
+        }
+
+    results = []
+    pending = {}
+    for scan in scans:
+        code = str(scan.get('ticket_code') or '') if isinstance(scan, dict) else ''
+        ticket = tickets.get(code)
+        result = {'ticket_code': code}
+        if not ticket:
+            result.update(result='invalid', message='Tiket Tidak Valid')
+        elif ticket.is_checked_in or code in pending:
+            result.update(result='already_used', message='Tiket Sudah Digunakan', user_name=ticket.name)
+        elif target_event_id and ticket.event_id != target_event_id:
+            result.update(result='wrong_event', message='Tiket ini untuk Event LAIN!', user_name=ticket.name)
+        else:
+            pending[code] = (ticket, parse_scanned_at(scan.get('scanned_at'), now))
+            result.update(result='ok', message='Check-in Berhasil', user_name=ticket.name)
+        results.append(result)
+
+    claimed_ids = set()
+    try:
+        if pending:
+            claimed_ids = set(db.session.execute(
+                db.update(Ticket).where(
+                    Ticket.id.in_([ticket.id for ticket, _ in pending.values()]),
+                    Ticket.is_checked_in == False
+                ).values(is_checked_in=True).returning(Ticket.id),
+                execution_options={'synchronize_session': False}
+            ).scalars())
+
+            claimed = [(ticket, scanned_at) for ticket, scanned_at in pending.values() if ticket.id in claimed_ids]
+            if claimed:
+                db.session.execute(db.insert(CheckIn), [
+                    {'ticket_id': ticket.id, 'timestamp': scanned_at} for ticket, scanned_at in claimed
+                ])
+                per_event = {}
+                for ticket, _ in claimed:
+                    per_event[ticket.event_id] = per_event.get(ticket.event_id, 0) + 1
+                for event_id, count in per_event.items():
+                    Event.query.filter_by(id=event_id).update(
+                        {Event.checked_in_count: Event.checked_in_count + count}, synchronize_session=False
+                    )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': f'Server Error: {str(e)}'}), 500
+
+    for result in results:
+        pending_scan = pending.get(result['ticket_code'])
+        if result['result'] != 'ok' or not pending_scan:
+            continue
+        ticket, scanned_at = pending_scan
+        if ticket.id not in claimed_ids:
+            # Sudah di-check-in oleh request lain di antara SELECT dan UPDATE.
+            result.update(result='already_used', message='Tiket Sudah Digunakan')
+            continue
+        notify_ticket_checked_in(ticket.ticket_code)
+        indexed = find_scanner_ticket(ticket.ticket_code, ticket.event_id)
+        if indexed:
+            entry = indexed[2]
+            update_scanner_entry(ticket.event_id, ticket.ticket_code, (entry[0], entry[1], entry[2], True, scanned_at))
+
+    summary = {}
+    for result in results:
+        summary[result['result']] = summary.get(result['result'], 0) + 1
+
+    return jsonify({'status': 'success', 'summary': summary, 'results': results}), 200
+
 @app.route('/api/event/<int:event_id>/open-post-test', methods=['POST'])
 @login_required
 @role_required(['admin', 'panitia'])
@@ -1137,6 +2438,51 @@ def get_ticket_status(ticket_code):
         'ticket_code': ticket.ticket_code
     })
 
+@app.route('/api/tickets/status/<string:ticket_code>/wait', methods=['GET'])
+@login_required
+def wait_ticket_status(ticket_code):
+    """
+    Long-poll pengganti polling 3 detik. Request ditahan sampai tiket di-check-in
+    atau `timeout` (default & maks 25 detik) habis, lalu mengembalikan status terakhir.
+    Check-in di proses yang sama membangunkan request seketika; status juga dicek ulang
+    ke database tiap beberapa detik agar check-in dari worker lain tetap terdeteksi.
+    Setiap request yang ditahan memakai satu thread worker, jadi jumlahnya dibatasi
+    TICKET_WAIT_MAX_WAITERS; bila penuh, status dijawab langsung beserta `retry_after`.
+    """
+    ticket = Ticket.query.filter_by(ticket_code=ticket_code).first_or_404()
+
+    if ticket.user_id != current_user.id:
+        return jsonify(message="Akses ditolak"), 403
+
+    timeout = min(max(request.args.get('timeout', TICKET_WAIT_MAX_SECONDS, type=int), 0), TICKET_WAIT_MAX_SECONDS)
+    is_checked_in = ticket.is_checked_in
+
+    if not is_checked_in and timeout > 0:
+        if not _ticket_wait_slots.acquire(blocking=False):
+            response = jsonify({
+                'is_checked_in': is_checked_in,
+                'ticket_code': ticket_code,
+                'retry_after': TICKET_WAIT_BUSY_RETRY_SECONDS
+            })
+            response.headers['Retry-After'] = str(TICKET_WAIT_BUSY_RETRY_SECONDS)
+            return response
+        try:
+            deadline = datetime.utcnow() + timedelta(seconds=timeout)
+            while not is_checked_in:
+                remaining = (deadline - datetime.utcnow()).total_seconds()
+                if remaining <= 0:
+                    break
+                db.session.close()
+                wait_for_ticket_notification(ticket_code, min(remaining, TICKET_WAIT_RECHECK_SECONDS))
+                is_checked_in = bool(db.session.query(Ticket.is_checked_in).filter_by(ticket_code=ticket_code).scalar())
+        finally:
+            _ticket_wait_slots.release()
+
+    return jsonify({
+        'is_checked_in': is_checked_in,
+        'ticket_code': ticket_code
+    })
+
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 @login_required
 def get_user_profile(user_id):
@@ -1178,7 +2524,11 @@ def reset_password_unverified():
 
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Poster ber-hash isi di-cache selamanya (immutable); upload lama divalidasi ulang lewat ETag."""
+    if HASHED_UPLOAD_PATTERN.match(filename):
+        return send_static_asset(app.config['UPLOAD_FOLDER'], filename, 'uploads', STATIC_IMMUTABLE_MAX_AGE,
+                                 immutable=True, etag=os.path.splitext(os.path.basename(filename))[0])
+    return send_static_asset(app.config['UPLOAD_FOLDER'], filename, 'uploads', STATIC_DEFAULT_MAX_AGE)
 
 @app.route('/api/user/businesses', methods=['GET'])
 @login_required
@@ -1193,58 +2543,10 @@ def get_user_businesses():
 @app.route('/api/user/businesses/<int:id>', methods=['GET'])
 @login_required
 def get_business_detail(id):
-    business = BusinessProfile.query.filter_by(id=id, user_id=current_user.id).first_or_404()
-    
-    marketplace = business.marketplaces.first()
-    license = business.licenses.first()
-    finance = business.finances.first()
-    npwp = business.npwps.first()
-    funding = business.fundings.first()
-
-    return jsonify({
-        'business_name': business.business_name,
-        'business_type': business.business_type,
-        'address_same_as_home': business.address_same_as_home,
-        'address_province': business.address_province,
-        'address_city': business.address_city,
-        'address_district': business.address_district,
-        'address_village': business.address_village,
-        'address_rt': business.address_rt, 'address_rw': business.address_rw,
-        'address_postal_code': business.address_postal_code,
-        'address_detail': business.address_detail,
-        'premise_status': business.premise_status,
-        'business_phone': business.business_phone,
-        'business_email': business.business_email,
-        'operating_since': business.operating_since,
-        'has_license': business.has_license,
-        'legal_entity': business.legal_entity,
-        'has_npwp': business.has_npwp,
-        'financial_report_type': business.financial_report_type,
-        'financial_report_app': business.financial_report_app,
-        'report_laba_rugi': business.report_laba_rugi,
-        'report_neraca': business.report_neraca,
-        'report_arus_kas': business.report_arus_kas,
-        'has_funding': business.has_funding,
-        'marketplace_type': marketplace.marketplace_type if marketplace else None,
-        'url': marketplace.url if marketplace else None,
-        'license_type': license.license_type if license else None,
-        'license_number': license.license_number if license else None,
-        'finance_year': finance.year if finance else None,
-        'omzet_range': finance.omzet_range if finance else None,
-        'profit': finance.profit if finance else None,
-        'asset_value': finance.asset_value if finance else None,
-        'employee_count': finance.employee_count if finance else None,
-        'npwp_number': npwp.npwp_number if npwp else None,
-        'report_receipt_number': npwp.report_receipt_number if npwp else None,
-        'npwp_year': npwp.year if npwp else None,
-        'submission_date': npwp.submission_date if npwp else None,
-        'funder_type': funding.funder_type if funding else None,
-        'funder_name': funding.funder_name if funding else None,
-        'amount': funding.amount if funding else None,
-        'received_date': funding.received_date if funding else None,
-        'installment_start_date': funding.installment_start_date if funding else None,
-        'duration_months': funding.duration_months if funding else None,
-    })
+    graph = load_business_graph(BusinessProfile.id == id, BusinessProfile.user_id == current_user.id)
+    if not graph:
+        abort(404)
+    return jsonify(serialize_business(graph))
 
 def upsert_sub_record(model_class, business_id, data):
     record = model_class.query.filter_by(business_id=business_id).first()
@@ -1399,21 +2701,29 @@ def dashboard():
     search = request.args.get('search', '')
 
     query = Event.query.filter_by(is_archived=False)
+    query, ranked = search_events(query, search)
 
-    if search:
-        query = query.filter(Event.title.ilike(f'%{search}%'))
-
-    pagination = query.order_by(Event.tgl_mulai_event.asc()).paginate(page=page, per_page=per_page, error_out=False)
-    
-    events = pagination.items
-    
-    for event in events: 
-        event.registered_count = Ticket.query.filter_by(event_id=event.id).count()
+    # Hasil pencarian diurutkan per relevansi (halaman bernomor); daftar biasa memakai
+    # cursor keyset (?after= / ?before=) agar halaman dalam tidak butuh OFFSET & COUNT.
+    pagination = keyset = None
+    if ranked:
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        events = pagination.items
+        total_events = pagination.total
+    else:
+        per_page = min(max(per_page, 1), EVENT_PAGE_MAX)
+        after = decode_event_cursor(request.args.get('after', ''))
+        before = decode_event_cursor(request.args.get('before', ''))
+        keyset = keyset_events(query, per_page, after=after, before=None if after else before)
+        events = keyset['items']
+        total_events = cached_event_count('dashboard', query)
 
     return render_template(
         'dashboard.html', 
         events=events, 
         pagination=pagination,
+        keyset=keyset,
+        total_events=total_events,
         current_search=search,
         current_per_page=per_page
     )
@@ -1426,12 +2736,11 @@ def archived_events_list():
     per_page = request.args.get('per_page', 10, type=int)
     search = request.args.get('search', '')
 
-    query = Event.query.filter_by(is_archived=True)
+    query, ranked = search_events(Event.query.filter_by(is_archived=True), search)
+    if not ranked:
+        query = query.order_by(Event.tgl_mulai_event.desc())
 
-    if search:
-        query = query.filter(Event.title.ilike(f'%{search}%'))
-
-    pagination = query.order_by(Event.tgl_mulai_event.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
     events = pagination.items
 
@@ -1511,8 +2820,7 @@ def new_event():
         file = request.files['gambar_event']
         filename = None
         if file and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            filename = save_event_poster(file)
         
         is_umkm_required = request.form.get('is_umkm_data_required') == 'on'
         
@@ -1597,14 +2905,14 @@ def edit_event(event_id):
             save_event_questions(event.id, request.form)
         else:
             EventQuestion.query.filter_by(event_id=event.id).delete()
+            bump_event_questions_version(event.id)
         
         file = request.files['gambar_event']
         if file and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            event.image_filename = filename
+            event.image_filename = save_event_poster(file)
             
         db.session.commit()
+        invalidate_event_questions(event.id)
         return redirect(url_for('dashboard'))
     
     def convert_to_wib_string(utc_naive_dt):
@@ -1624,8 +2932,10 @@ def edit_event(event_id):
 @login_required
 @role_required(['admin'])
 def event_detail(event_id):
-    event = Event.query.get_or_404(event_id); tickets = Ticket.query.filter_by(event_id=event_id).all()
-    event.registered_count = len(tickets); event.checked_in_count = Ticket.query.filter_by(event_id=event_id, is_checked_in=True).count()
+    event = Event.query.get_or_404(event_id)
+    tickets = Ticket.query.options(
+        db.joinedload(Ticket.user), db.joinedload(Ticket.check_ins)
+    ).filter_by(event_id=event_id).order_by(Ticket.id).all()
     return render_template('event_detail.html', event=event, tickets=tickets)
 
 @app.route('/panitia/dashboard')
@@ -1656,6 +2966,8 @@ def event_scanner(event_id):
     if now_utc < start_window and current_user.role != 'admin':
         flash("Check-in baru bisa dilakukan 3 jam sebelum acara.", "warning")
         return redirect(url_for('panitia_dashboard'))
+
+    warm_scanner_index(event)
         
     return render_template('scanner.html', event=event)
 
@@ -1676,35 +2988,7 @@ def reports():
     sort_by = request.args.get('sort_by', 'date') 
     order = request.args.get('order', 'asc')
     
-    events_in_month = Event.query.filter(
-        extract('year', Event.tgl_mulai_event) == selected_year,
-        extract('month', Event.tgl_mulai_event) == selected_month
-    ).all()
-    
-    event_data = []
-    for event in events_in_month:
-        reg_count = Ticket.query.filter_by(event_id=event.id).count()
-        check_count = Ticket.query.filter_by(event_id=event.id, is_checked_in=True).count()
-        rate = (check_count / reg_count) * 100 if reg_count > 0 else 0
-            
-        event_data.append({
-            'event': event,
-            'registered': reg_count,
-            'checked_in': check_count,
-            'rate': rate
-        })
-
-    reverse = (order == 'desc')
-    if sort_by == 'registered':
-        key_func = lambda x: x['registered']
-    elif sort_by == 'checked_in':
-        key_func = lambda x: x['checked_in']
-    elif sort_by == 'rate':
-        key_func = lambda x: x['rate']
-    else:
-        key_func = lambda x: x['event'].tgl_mulai_event
-        
-    sorted_data = sorted(event_data, key=key_func, reverse=reverse)
+    sorted_data = monthly_event_report(selected_year, selected_month, sort_by, order)
     
     chart_labels = [data['event'].title for data in sorted_data]
     
@@ -1740,15 +3024,398 @@ def reports():
         chart_title=chart_title
     )
 
-def serialize_business(business):
-    if not business:
+class ReportSnapshot(db.Model):
+    """
+    Rekap laporan bulanan per (tahun, bulan, event) untuk bulan yang sudah lewat.
+    event_start & counter disimpan untuk mendeteksi bulan yang perlu dihitung ulang.
+    """
+    __table_args__ = (db.UniqueConstraint('year', 'month', 'event_id', name='uq_report_snapshot_month_event'),)
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id', ondelete='CASCADE'), nullable=False, index=True)
+    event_start = db.Column(db.DateTime, nullable=False)
+    registered = db.Column(db.Integer, nullable=False, default=0)
+    checked_in = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+def month_bounds(year, month):
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return month_start, month_end
+
+def report_sort_order(sort_column, order):
+    if order == 'desc':
+        return sort_column.desc(), Event.id.desc()
+    return sort_column.asc(), Event.id.asc()
+
+def live_event_report(year, month, sort_by='date', order='asc'):
+    """
+    Rekap per event untuk satu bulan dalam SATU query (LEFT JOIN + GROUP BY).
+    Terdaftar, hadir, dan persentase kehadiran dihitung & diurutkan oleh database.
+    """
+    month_start, month_end = month_bounds(year, month)
+
+    registered = db.func.count(Ticket.id)
+    checked_in = db.func.coalesce(db.func.sum(db.case((Ticket.is_checked_in == True, 1), else_=0)), 0)
+    rate = db.case((registered > 0, checked_in * 100.0 / registered), else_=0.0)
+
+    query = db.session.query(
+        Event, registered.label('registered'), checked_in.label('checked_in'), rate.label('rate')
+    ).outerjoin(Ticket, Ticket.event_id == Event.id).filter(
+        Event.tgl_mulai_event >= month_start,
+        Event.tgl_mulai_event < month_end
+    ).group_by(Event.id)
+
+    sort_column = {'registered': registered, 'checked_in': checked_in, 'rate': rate}.get(sort_by, Event.tgl_mulai_event)
+    query = query.order_by(*report_sort_order(sort_column, order))
+
+    return [{
+        'event': event,
+        'registered': reg_count,
+        'checked_in': check_count,
+        'rate': float(rate_value or 0)
+    } for event, reg_count, check_count, rate_value in query.all()]
+
+def snapshot_event_report(year, month, sort_by='date', order='asc'):
+    """
+    Rekap bulan lampau dari ReportSnapshot (tanpa scan tiket). Mengembalikan None bila ada
+    event di bulan itu yang belum punya snapshot, agar pemanggil jatuh ke perhitungan live.
+    """
+    month_start, month_end = month_bounds(year, month)
+    rate = db.case(
+        (ReportSnapshot.registered > 0, ReportSnapshot.checked_in * 100.0 / ReportSnapshot.registered), else_=0.0
+    )
+    query = db.session.query(Event, ReportSnapshot.registered, ReportSnapshot.checked_in, rate).outerjoin(
+        ReportSnapshot, db.and_(
+            ReportSnapshot.event_id == Event.id, ReportSnapshot.year == year, ReportSnapshot.month == month
+        )
+    ).filter(Event.tgl_mulai_event >= month_start, Event.tgl_mulai_event < month_end)
+
+    sort_column = {
+        'registered': ReportSnapshot.registered, 'checked_in': ReportSnapshot.checked_in, 'rate': rate
+    }.get(sort_by, Event.tgl_mulai_event)
+    rows = query.order_by(*report_sort_order(sort_column, order)).all()
+    if any(reg_count is None for _, reg_count, _, _ in rows):
+        return None
+
+    return [{
+        'event': event,
+        'registered': reg_count,
+        'checked_in': check_count,
+        'rate': float(rate_value or 0)
+    } for event, reg_count, check_count, rate_value in rows]
+
+def monthly_event_report(year, month, sort_by='date', order='asc'):
+    """Bulan yang sudah lewat dibaca dari snapshot; bulan berjalan (dan yang akan datang) dihitung live."""
+    now = datetime.utcnow()
+    if (year, month) < (now.year, now.month):
+        rows = snapshot_event_report(year, month, sort_by, order)
+        if rows is not None:
+            return rows
+    return live_event_report(year, month, sort_by, order)
+
+def stale_report_months():
+    """
+    Bulan lampau yang snapshot-nya perlu dihitung ulang, dalam satu query: event tanpa snapshot,
+    counter event (registered/checked_in) yang berubah sejak snapshot, atau event yang pindah bulan.
+    """
+    now = datetime.utcnow()
+    current_month = (now.year, now.month)
+    rows = db.session.query(
+        Event.tgl_mulai_event, ReportSnapshot.year, ReportSnapshot.month
+    ).outerjoin(ReportSnapshot, ReportSnapshot.event_id == Event.id).filter(db.or_(
+        ReportSnapshot.id.is_(None),
+        ReportSnapshot.registered != Event.registered_count,
+        ReportSnapshot.checked_in != Event.checked_in_count,
+        ReportSnapshot.event_start != Event.tgl_mulai_event
+    )).all()
+
+    months = set()
+    for start, snapshot_year, snapshot_month in rows:
+        months.add((start.year, start.month))
+        if snapshot_year is not None:
+            months.add((snapshot_year, snapshot_month))
+    return sorted(month for month in months if month < current_month)
+
+def refresh_report_snapshot(year, month):
+    """Mengganti snapshot satu bulan dengan hasil INSERT ... SELECT agregat tiket per event."""
+    month_start, month_end = month_bounds(year, month)
+    ReportSnapshot.query.filter_by(year=year, month=month).delete(synchronize_session=False)
+
+    registered = db.func.count(Ticket.id)
+    checked_in = db.func.coalesce(db.func.sum(db.case((Ticket.is_checked_in == True, 1), else_=0)), 0)
+    source = db.select(
+        db.literal(year), db.literal(month), Event.id, Event.tgl_mulai_event,
+        registered, checked_in, db.literal(datetime.utcnow())
+    ).select_from(Event).outerjoin(Ticket, Ticket.event_id == Event.id).where(
+        Event.tgl_mulai_event >= month_start,
+        Event.tgl_mulai_event < month_end
+    ).group_by(Event.id, Event.tgl_mulai_event)
+    result = db.session.execute(db.insert(ReportSnapshot).from_select(
+        ['year', 'month', 'event_id', 'event_start', 'registered', 'checked_in', 'refreshed_at'], source
+    ))
+    db.session.commit()
+    return result.rowcount
+
+@app.cli.command("refresh-report-snapshots")
+@click.option('--all', 'refresh_all', is_flag=True, help='Hitung ulang semua bulan lampau, bukan hanya yang berubah.')
+def refresh_report_snapshots_command(refresh_all):
+    """Memperbarui snapshot laporan bulanan untuk bulan lampau yang tiket/check-in-nya berubah."""
+    if refresh_all:
+        now = datetime.utcnow()
+        starts = db.session.query(Event.tgl_mulai_event).filter(Event.tgl_mulai_event < datetime(now.year, now.month, 1))
+        months = sorted({(start.year, start.month) for start, in starts})
+    else:
+        months = stale_report_months()
+
+    if not months:
+        print("Snapshot laporan sudah terbaru.")
+        return
+    for year, month in months:
+        count = refresh_report_snapshot(year, month)
+        print(f"Snapshot {month:02d}/{year}: {count} event.")
+    print(f"Selesai. {len(months)} bulan diperbarui.")
+
+TEST_ANALYTICS_CACHE_TTL = 600
+SCORE_BUCKETS = [(0, 19, '0-19'), (20, 39, '20-39'), (40, 59, '40-59'), (60, 79, '60-79'), (80, 100, '80-100')]
+GAIN_BUCKETS = [(-100, -1, 'Turun'), (0, 0, 'Tetap'), (1, 20, '+1-20'), (21, 40, '+21-40'), (41, 60, '+41-60'), (61, 100, '+61-100')]
+
+_test_analytics_cache = {}
+_test_analytics_cache_lock = threading.Lock()
+
+def weighted_median(counts):
+    """Median dari histogram {nilai: jumlah}."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    middle = [(total - 1) // 2, total // 2]
+    values, seen = [], 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while middle and middle[0] < seen:
+            values.append(value)
+            middle.pop(0)
+    return sum(values) / len(values)
+
+def bucket_counts(counts, buckets):
+    return [sum(n for value, n in counts.items() if low <= value <= high) for low, high, _ in buckets]
+
+def summarize_test_scores(cells):
+    """
+    Metrik learning gain dari histogram gabungan [(pre, post, jumlah)]. Rata-rata & gain hanya
+    dihitung dari peserta yang mengerjakan keduanya; normalized gain memakai rumus Hake
+    <g> = (rata2 post - rata2 pre) / (100 - rata2 pre).
+    """
+    pre_counts, post_counts, gain_counts = {}, {}, {}
+    paired_pre = paired_post = 0
+    for pre, post, n in cells:
+        if pre is not None:
+            pre_counts[pre] = pre_counts.get(pre, 0) + n
+        if post is not None:
+            post_counts[post] = post_counts.get(post, 0) + n
+        if pre is not None and post is not None:
+            gain_counts[post - pre] = gain_counts.get(post - pre, 0) + n
+            paired_pre += pre * n
+            paired_post += post * n
+
+    participants = sum(pre_counts.values())
+    completed = sum(gain_counts.values())
+    mean_pre = paired_pre / completed if completed else None
+    mean_post = paired_post / completed if completed else None
+    return {
+        'participants': participants,
+        'completed': completed,
+        'completion_rate': completed * 100.0 / participants if participants else 0.0,
+        'mean_pre': mean_pre,
+        'mean_post': mean_post,
+        'mean_gain': mean_post - mean_pre if completed else None,
+        'median_gain': weighted_median(gain_counts),
+        'normalized_gain': (mean_post - mean_pre) / (100 - mean_pre) if completed and mean_pre < 100 else None,
+        'pre_distribution': bucket_counts(pre_counts, SCORE_BUCKETS),
+        'post_distribution': bucket_counts(post_counts, SCORE_BUCKETS),
+        'gain_distribution': bucket_counts(gain_counts, GAIN_BUCKETS),
+    }
+
+def test_score_analytics(year=None):
+    """
+    Analitik pre/post-test per event, per bulan, dan total dalam DUA query: daftar event ber-tes
+    dan histogram (event, pre, post, jumlah) hasil GROUP BY. Median & distribusi dihitung dari
+    histogram, bukan per peserta. Hasil di-cache per proses dan hanya dipakai selama stempel
+    data (test_analytics_stamp) belum berubah, jadi nilai yang masuk lewat worker lain ikut
+    terhitung; TTL hanya batas atas umur cache.
+    """
+    now = monotonic()
+    stamp = test_analytics_stamp()
+    with _test_analytics_cache_lock:
+        entry = _test_analytics_cache.get(year)
+        if entry and entry[0] > now and entry[1] == stamp:
+            return entry[2]
+
+    event_query = db.session.query(
+        Event.id, Event.title, Event.tgl_mulai_event, Event.registered_count
+    ).filter(Event.has_pre_post_test == True)
+    score_query = db.session.query(
+        UserTestScore.event_id, UserTestScore.pre_test_score, UserTestScore.post_test_score, db.func.count()
+    ).join(Event, Event.id == UserTestScore.event_id).filter(Event.has_pre_post_test == True)
+    if year:
+        year_range = (Event.tgl_mulai_event >= datetime(year, 1, 1), Event.tgl_mulai_event < datetime(year + 1, 1, 1))
+        event_query = event_query.filter(*year_range)
+        score_query = score_query.filter(*year_range)
+
+    events = event_query.order_by(Event.tgl_mulai_event.desc(), Event.id.desc()).all()
+    cells_by_event = {}
+    for event_id, pre, post, n in score_query.group_by(
+        UserTestScore.event_id, UserTestScore.pre_test_score, UserTestScore.post_test_score
+    ):
+        cells_by_event.setdefault(event_id, []).append((pre, post, n))
+
+    event_rows, cells_by_month, all_cells = [], {}, []
+    for event_id, title, start, registered in events:
+        cells = cells_by_event.get(event_id, [])
+        stats = summarize_test_scores(cells)
+        stats.update(event_id=event_id, title=title, start=start, registered=registered or 0,
+                     pre_test_rate=stats['participants'] * 100.0 / registered if registered else 0.0)
+        event_rows.append(stats)
+        month = cells_by_month.setdefault((start.year, start.month), {'events': 0, 'registered': 0, 'cells': []})
+        month['events'] += 1
+        month['registered'] += registered or 0
+        month['cells'].extend(cells)
+        all_cells.extend(cells)
+
+    month_rows = []
+    for (month_year, month), data in sorted(cells_by_month.items(), reverse=True):
+        stats = summarize_test_scores(data['cells'])
+        stats.update(year=month_year, month=month, events=data['events'], registered=data['registered'])
+        month_rows.append(stats)
+
+    analytics = {
+        'overall': dict(summarize_test_scores(all_cells), events=len(events)),
+        'months': month_rows,
+        'events': event_rows,
+    }
+    with _test_analytics_cache_lock:
+        _test_analytics_cache[year] = (now + TEST_ANALYTICS_CACHE_TTL, stamp, analytics)
+    return analytics
+
+def test_analytics_stamp():
+    """
+    Satu query murah (agregat tanpa GROUP BY) yang berubah setiap ada nilai baru/dihapus, event
+    ber-tes diubah/dihapus, atau counter pendaftar berubah.
+    """
+    has_test = Event.has_pre_post_test == True
+    return tuple(db.session.query(
+        db.select(db.func.max(UserTestScore.pre_test_submitted_at)).scalar_subquery(),
+        db.select(db.func.max(UserTestScore.post_test_submitted_at)).scalar_subquery(),
+        db.select(db.func.count()).select_from(UserTestScore).scalar_subquery(),
+        db.select(db.func.max(Event.updated_at)).filter(has_test).scalar_subquery(),
+        db.select(db.func.count()).select_from(Event).filter(has_test).scalar_subquery(),
+        db.select(db.func.sum(Event.registered_count)).filter(has_test).scalar_subquery(),
+    ).one())
+
+@db.event.listens_for(UserTestScore, 'after_insert')
+@db.event.listens_for(UserTestScore, 'after_update')
+@db.event.listens_for(UserTestScore, 'after_delete')
+@db.event.listens_for(Event, 'after_insert')
+@db.event.listens_for(Event, 'after_update')
+@db.event.listens_for(Event, 'after_delete')
+def clear_test_analytics_cache(mapper, connection, target):
+    with _test_analytics_cache_lock:
+        _test_analytics_cache.clear()
+
+@app.route('/reports/test-analytics')
+@login_required
+@role_required(['admin'])
+def test_analytics():
+    """Dampak pelatihan: rekap nilai pre/post-test per event dan per bulan."""
+    now = datetime.utcnow()
+    selected_year = request.args.get('year', type=int)
+    if selected_year is None:
+        selected_year = now.year
+    analytics = test_score_analytics(selected_year or None)
+
+    selected_event_id = request.args.get('event_id', type=int)
+    focus = next((row for row in analytics['events'] if row['event_id'] == selected_event_id), None) or analytics['overall']
+
+    months = [
+        'Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
+        'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember'
+    ]
+    return render_template(
+        'test_analytics.html',
+        analytics=analytics,
+        focus=focus,
+        selected_year=selected_year,
+        selected_event_id=selected_event_id if focus is not analytics['overall'] else None,
+        years=range(now.year - 3, now.year + 2),
+        month_names=months,
+        score_labels=[label for _, _, label in SCORE_BUCKETS],
+        gain_labels=[label for _, _, label in GAIN_BUCKETS]
+    )
+
+BUSINESS_SUB_RECORDS = {
+    'marketplace': BusinessMarketplace,
+    'license': BusinessLicense,
+    'finance': BusinessFinance,
+    'npwp': BusinessNPWP,
+    'funding': BusinessFunding,
+}
+
+def load_business_graphs(*criteria, include=None):
+    """
+    Memuat profil UMKM beserta sub-record pertamanya (id terkecil) dalam SATU query:
+    setiap tabel sub-record di-LEFT JOIN pada MIN(id) per bisnis, pengganti lima .first().
+    Mengembalikan list dict {'business': ..., 'marketplace': ..., ...}.
+    """
+    names = [name for name in BUSINESS_SUB_RECORDS if include is None or name in include]
+    aliases = [db.aliased(BUSINESS_SUB_RECORDS[name]) for name in names]
+    query = db.session.query(BusinessProfile, *aliases).select_from(BusinessProfile)
+    for name, alias in zip(names, aliases):
+        model_class = BUSINESS_SUB_RECORDS[name]
+        first_id = db.select(db.func.min(model_class.id)).where(
+            model_class.business_id == BusinessProfile.id
+        ).correlate(BusinessProfile).scalar_subquery()
+        query = query.outerjoin(alias, alias.id == first_id)
+
+    graphs = []
+    for row in query.filter(*criteria).order_by(BusinessProfile.id):
+        graph = dict.fromkeys(BUSINESS_SUB_RECORDS)
+        graph['business'] = row[0]
+        graph.update(zip(names, row[1:]))
+        graphs.append(graph)
+    return graphs
+
+def load_business_graph(*criteria):
+    graphs = load_business_graphs(*criteria)
+    return graphs[0] if graphs else None
+
+def load_user_business_graphs(user_ids, include=None):
+    """Bisnis pertama (id terkecil) tiap user beserta sub-record-nya: {user_id: graph}, satu query."""
+    if not user_ids:
+        return {}
+    first_business_ids = db.select(db.func.min(BusinessProfile.id)).where(
+        BusinessProfile.user_id.in_(set(user_ids))
+    ).group_by(BusinessProfile.user_id)
+    return {
+        graph['business'].user_id: graph
+        for graph in load_business_graphs(BusinessProfile.id.in_(first_business_ids), include=include)
+    }
+
+def serialize_businesses(graphs):
+    """Versi batch serialize_business untuk layar admin (detail user, export CSV): {user_id: dict}."""
+    return {graph['business'].user_id: serialize_business(graph) for graph in graphs}
+
+def serialize_business(graph):
+    """Serialisasi profil UMKM dari hasil load_business_graph(s); tidak menjalankan query."""
+    if not graph:
         return None
     
-    marketplace = business.marketplaces.first()
-    license = business.licenses.first()
-    finance = business.finances.first()
-    npwp = business.npwps.first()
-    funding = business.fundings.first()
+    business = graph['business']
+    marketplace = graph['marketplace']
+    license = graph['license']
+    finance = graph['finance']
+    npwp = graph['npwp']
+    funding = graph['funding']
 
     return {
         'business_name': business.business_name,
@@ -1804,23 +3471,46 @@ def serialize_business(business):
         'duration_months': funding.duration_months if funding else None,
     }
 
+APK_CACHE_MAX_AGE = 300
+
+_apk_download_slots = threading.BoundedSemaphore(app.config['APK_MAX_CONCURRENT_DOWNLOADS'])
+
 @app.route('/api/public/download/apk', methods=['GET'])
 def public_download_apk():
     """
     Endpoint PUBLIK untuk mendownload APK terbaru.
+    Mendukung Range (resume download) dan ETag. Tanpa offload proxy, jumlah download
+    paralel dibatasi agar thread worker tetap tersedia untuk API.
     """
+    apk_directory = os.path.join('static', 'apk')
+    filename = 'OK OCE.apk'
+    if not os.path.isfile(os.path.join(app.root_path, apk_directory, filename)):
+        return jsonify({'status': 'error', 'message': 'File APK belum tersedia di server.'}), 404
+
+    offloaded = app.config['STATIC_OFFLOAD'] in ('x-accel', 'x-sendfile')
+    if not offloaded and not _apk_download_slots.acquire(blocking=False):
+        response = jsonify({'status': 'error', 'message': 'Server sedang sibuk melayani download. Coba lagi sebentar.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
     try:
-        apk_directory = os.path.join(app.root_path, 'static', 'apk')
-        filename = 'OK OCE.apk'
-
-        return send_from_directory(
-            directory=apk_directory,
-            path=filename,
-            as_attachment=True, 
-            download_name='OKOCE.apk'
+        response = send_static_asset(
+            apk_directory, filename, 'apk', APK_CACHE_MAX_AGE,
+            as_attachment=True, download_name='OKOCE.apk'
         )
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': 'File APK belum tersedia di server.'}), 404
+    except Exception:
+        if not offloaded:
+            _apk_download_slots.release()
+        raise
+    if not offloaded:
+        if response.status_code == 304 or request.method == 'HEAD':
+            _apk_download_slots.release()
+        else:
+            # Response file memakai direct_passthrough sehingga call_on_close tidak dipanggil;
+            # slot dilepas saat server WSGI menutup iterator body.
+            response.response = ClosingIterator(response.response, _apk_download_slots.release)
+    return response
     
 @app.route('/reports/download')
 @login_required
@@ -1834,20 +3524,18 @@ def download_monthly_report():
         selected_month = now.month
         selected_year = now.year
 
-    events_in_month = Event.query.filter(
-        extract('year', Event.tgl_mulai_event) == selected_year,
-        extract('month', Event.tgl_mulai_event) == selected_month
-    ).order_by(Event.tgl_mulai_event.asc()).all()
+    report_rows = monthly_event_report(selected_year, selected_month)
 
     si = io.StringIO()
     writer = csv.writer(si)
     
     writer.writerow(['No', 'Nama Event', 'Tanggal Mulai', 'Lokasi', 'Kuota', 'Terdaftar', 'Hadir (Check-in)', 'Persentase Kehadiran (%)'])
 
-    for i, event in enumerate(events_in_month, 1):
-        reg_count = Ticket.query.filter_by(event_id=event.id).count()
-        check_count = Ticket.query.filter_by(event_id=event.id, is_checked_in=True).count()
-        rate = (check_count / reg_count) * 100 if reg_count > 0 else 0
+    for i, data in enumerate(report_rows, 1):
+        event = data['event']
+        reg_count = data['registered']
+        check_count = data['checked_in']
+        rate = data['rate']
         
         dt_aware_utc = pytz.utc.localize(event.tgl_mulai_event)
         dt_aware_wib = dt_aware_utc.astimezone(LOCAL_TZ)
@@ -1875,12 +3563,38 @@ def download_monthly_report():
         headers={"Content-Disposition": f"attachment;filename={filename}"}
     )
 
+@app.route('/api/admin/cache-stats')
+@login_required
+@role_required(['admin'])
+def cache_stats():
+    with _identity_cache_lock:
+        identity = dict(identity_cache_stats, size=len(_identity_cache))
+    lookups = identity['hits'] + identity['misses']
+    identity['hit_rate'] = round(identity['hits'] / lookups, 4) if lookups else 0.0
+    return jsonify({'identity_cache': identity})
+
+def metrics_access_allowed():
+    if current_user.is_authenticated and current_user.role == 'admin':
+        return True
+    token = app.config['METRICS_TOKEN']
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), token.encode()):
+        return True
+    return request.remote_addr in app.config['METRICS_ALLOWLIST']
+
+@app.route('/metrics')
+def metrics():
+    """Metrics Prometheus; untuk admin yang login, scraper dengan METRICS_TOKEN, atau IP di METRICS_ALLOWLIST."""
+    if not metrics_access_allowed():
+        return jsonify({'message': 'Akses ditolak'}), 403
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/admin/user/<int:user_id>/details')
 @login_required
 @role_required(['admin'])
 def get_user_details_admin(user_id):
     user = User.query.get_or_404(user_id)
-    business_data = serialize_business(user.businesses.first()) 
+    business_data = serialize_businesses(load_user_business_graphs([user_id]).values()).get(user_id)
 
     event_id = request.args.get('event_id')
     test_data = None
@@ -1907,6 +3621,95 @@ def get_user_details_admin(user_id):
     }
     return jsonify(user_data)
 
+EXPORT_CHUNK_SIZE = 500
+
+# Registry kolom export peserta: nama kolom -> (relasi yang dibutuhkan, accessor).
+# Accessor hanya dipanggil bila relasinya ada; jika tidak, sel diisi '-'.
+# Kolom export: (relasi, getter). Kolom UMKM memakai key hasil serialize_business; relasinya
+# (business/marketplace/...) menentukan sub-record mana yang dimuat.
+EXPORT_COLUMNS = {
+    'Nama Peserta': ('user', lambda u: u.name),
+    'OK OCE ID': ('user', lambda u: u.okoce_id),
+    'No. HP': ('user', lambda u: u.phone_number),
+    'Email': ('user', lambda u: u.email),
+    'Provinsi': ('user', lambda u: u.province),
+    'Kota': ('user', lambda u: u.city),
+    'Instansi': ('user', lambda u: u.institution),
+    'Status Hadir': ('ticket', lambda t: "Hadir" if t.is_checked_in else "Belum Hadir"),
+    'Waktu Check-in': ('check_in', lambda c: c.timestamp.strftime('%Y-%m-%d %H:%M:%S')),
+    'Nilai Pre-Test': ('score', lambda s: s.pre_test_score if s.pre_test_score is not None else '-'),
+    'Nilai Post-Test': ('score', lambda s: s.post_test_score if s.post_test_score is not None else '-'),
+    'Nama Bisnis': ('business', 'business_name'),
+    'Jenis Bisnis': ('business', 'business_type'),
+    'Provinsi Bisnis': ('business', 'address_province'),
+    'Kota Bisnis': ('business', 'address_city'),
+    'Kecamatan Bisnis': ('business', 'address_district'),
+    'Kelurahan Bisnis': ('business', 'address_village'),
+    'Status Tempat': ('business', 'premise_status'),
+    'Badan Usaha': ('business', 'legal_entity'),
+    'No. HP Bisnis': ('business', 'business_phone'),
+    'Email Bisnis': ('business', 'business_email'),
+    'Mulai Beroperasi': ('business', 'operating_since'),
+    'Marketplace': ('marketplace', 'marketplace_type'),
+    'URL Marketplace': ('marketplace', 'url'),
+    'Jenis Izin': ('license', 'license_type'),
+    'Nomor Izin': ('license', 'license_number'),
+    'Tahun Data Keuangan': ('finance', 'finance_year'),
+    'Omzet Tahunan': ('finance', 'omzet_range'),
+    'Profit': ('finance', 'profit'),
+    'Aset': ('finance', 'asset_value'),
+    'Jumlah Karyawan': ('finance', 'employee_count'),
+    'Nomor NPWP': ('npwp', 'npwp_number'),
+    'Jenis Pemodal': ('funding', 'funder_type'),
+    'Nama Pemodal': ('funding', 'funder_name'),
+    'Jumlah Modal': ('funding', 'amount'),
+}
+
+def plan_export_relations(selected_columns):
+    """Menentukan relasi minimal yang harus dimuat untuk kolom yang dipilih."""
+    relations = {EXPORT_COLUMNS[col][0] for col in selected_columns if col in EXPORT_COLUMNS}
+    if relations & set(BUSINESS_SUB_RECORDS):
+        relations.add('business')
+    return relations
+
+def iter_ticket_chunks(event_id, options=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Mengambil tiket sebuah event per batch (keyset pada Ticket.id)."""
+    last_id = 0
+    while True:
+        chunk = Ticket.query.options(*options).filter(
+            Ticket.event_id == event_id, Ticket.id > last_id
+        ).order_by(Ticket.id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+def load_export_chunk(chunk, event_id, relations):
+    """Memuat relasi yang direncanakan untuk satu batch tiket; hasilnya satu dict relasi per tiket."""
+    user_ids = [t.user_id for t in chunk]
+    graphs = load_user_business_graphs(user_ids, include=relations) if 'business' in relations else {}
+    businesses = serialize_businesses(graphs.values())
+    scores = {}
+    if 'score' in relations:
+        scores = {
+            score.user_id: score for score in
+            UserTestScore.query.filter(UserTestScore.event_id == event_id, UserTestScore.user_id.in_(user_ids))
+        }
+
+    for ticket in chunk:
+        context = {
+            'ticket': ticket,
+            'user': ticket.user if 'user' in relations else None,
+            'check_in': (ticket.check_ins[0] if ticket.check_ins else None) if 'check_in' in relations else None,
+            'score': scores.get(ticket.user_id),
+        }
+        # Kolom sub-record membaca dict bisnis yang sama; None (jadi '-') bila sub-record-nya tidak ada.
+        graph = graphs.get(ticket.user_id)
+        context['business'] = businesses.get(ticket.user_id)
+        for name in BUSINESS_SUB_RECORDS:
+            context[name] = context['business'] if graph and graph[name] is not None else None
+        yield context
+
 @app.route('/event/<int:event_id>/download-csv', methods=['POST'])
 @login_required
 @role_required(['admin'])
@@ -1918,70 +3721,41 @@ def download_csv(event_id):
         flash("Anda harus memilih setidaknya satu kolom.", "warning")
         return redirect(url_for('event_detail', event_id=event_id))
 
-    tickets = Ticket.query.filter_by(event_id=event_id).all()
-    
-    si = io.StringIO()
-    writer = csv.writer(si)
-    writer.writerow(selected_columns)
-    
-    for ticket in tickets:
-        user = ticket.user
-        check_in = ticket.check_ins[0] if ticket.check_ins else None
-        business = user.businesses.first()
-        marketplace = business.marketplaces.first() if business else None
-        license = business.licenses.first() if business else None
-        finance = business.finances.first() if business else None
-        npwp = business.npwps.first() if business else None
-        funding = business.fundings.first() if business else None
-        score = UserTestScore.query.filter_by(user_id=user.id, event_id=event_id).first()
-        
-        row = []
-        for col_name in selected_columns:
-            if col_name == 'Nama Peserta': row.append(user.name)
-            elif col_name == 'OK OCE ID': row.append(user.okoce_id)
-            elif col_name == 'No. HP': row.append(user.phone_number)
-            elif col_name == 'Email': row.append(user.email)
-            elif col_name == 'Provinsi': row.append(user.province)
-            elif col_name == 'Kota': row.append(user.city)
-            elif col_name == 'Instansi': row.append(user.institution)
-            elif col_name == 'Status Hadir': row.append("Hadir" if ticket.is_checked_in else "Belum Hadir")
-            elif col_name == 'Waktu Check-in': row.append(check_in.timestamp.strftime('%Y-%m-%d %H:%M:%S') if check_in else '-')
-            elif col_name == 'Nilai Pre-Test': row.append(score.pre_test_score if score and score.pre_test_score is not None else '-')
-            elif col_name == 'Nilai Post-Test': row.append(score.post_test_score if score and score.post_test_score is not None else '-')
-            elif col_name == 'Nama Bisnis': row.append(business.business_name if business else '-')
-            elif col_name == 'Jenis Bisnis': row.append(business.business_type if business else '-')
-            elif col_name == 'Provinsi Bisnis': row.append(business.address_province if business else '-')
-            elif col_name == 'Kota Bisnis': row.append(business.address_city if business else '-')
-            elif col_name == 'Kecamatan Bisnis': row.append(business.address_district if business else '-')
-            elif col_name == 'Kelurahan Bisnis': row.append(business.address_village if business else '-')
-            elif col_name == 'Status Tempat': row.append(business.premise_status if business else '-')
-            elif col_name == 'Badan Usaha': row.append(business.legal_entity if business else '-')
-            elif col_name == 'No. HP Bisnis': row.append(business.business_phone if business else '-')
-            elif col_name == 'Email Bisnis': row.append(business.business_email if business else '-')
-            elif col_name == 'Mulai Beroperasi': row.append(business.operating_since if business else '-')
-            elif col_name == 'Marketplace': row.append(marketplace.marketplace_type if marketplace else '-')
-            elif col_name == 'URL Marketplace': row.append(marketplace.url if marketplace else '-')
-            elif col_name == 'Jenis Izin': row.append(license.license_type if license else '-')
-            elif col_name == 'Nomor Izin': row.append(license.license_number if license else '-')
-            elif col_name == 'Tahun Data Keuangan': row.append(finance.year if finance else '-')
-            elif col_name == 'Omzet Tahunan': row.append(finance.omzet_range if finance else '-')
-            elif col_name == 'Profit': row.append(finance.profit if finance else '-')
-            elif col_name == 'Aset': row.append(finance.asset_value if finance else '-')
-            elif col_name == 'Jumlah Karyawan': row.append(finance.employee_count if finance else '-')
-            elif col_name == 'Nomor NPWP': row.append(npwp.npwp_number if npwp else '-')
-            elif col_name == 'Jenis Pemodal': row.append(funding.funder_type if funding else '-')
-            elif col_name == 'Nama Pemodal': row.append(funding.funder_name if funding else '-')
-            elif col_name == 'Jumlah Modal': row.append(funding.amount if funding else '-')
-            else:
-                row.append('-')
-        
-        writer.writerow(row)
-    
-    output = si.getvalue()
-    si.close()
-    
+    relations = plan_export_relations(selected_columns)
+    options = []
+    if 'user' in relations:
+        options.append(db.joinedload(Ticket.user))
+    if 'check_in' in relations:
+        options.append(db.selectinload(Ticket.check_ins))
+    accessors = [EXPORT_COLUMNS.get(col_name) for col_name in selected_columns]
+
+    def generate():
+        si = io.StringIO()
+        writer = csv.writer(si)
+        writer.writerow(selected_columns)
+        yield si.getvalue()
+        si.seek(0); si.truncate(0)
+
+        for chunk in iter_ticket_chunks(event_id, options):
+            for context in load_export_chunk(chunk, event_id, relations):
+                row = []
+                for accessor in accessors:
+                    if accessor is None:
+                        row.append('-')
+                        continue
+                    relation, getter = accessor
+                    record = context[relation]
+                    if record is None:
+                        row.append('-')
+                    else:
+                        row.append(record[getter] if isinstance(getter, str) else getter(record))
+                writer.writerow(row)
+
+            yield si.getvalue()
+            si.seek(0); si.truncate(0)
+
     return Response(
-        output,
+        stream_with_context(generate()),
         mimetype="text/csv",
         headers={"Content-Disposition": f"attachment;filename=peserta_event_{event.id}.csv"}
     )
@@ -1991,14 +3765,41 @@ def init_db_command():
     """Membersihkan dan membuat ulang skema database."""
     db.drop_all()
     db.create_all()
+    migrations.stamp_all_migrations()
     print("----------------------------------------")
     print("Database schema berhasil dibuat ulang.")
     print("Jalankan 'flask seed-db' untuk mengisi data demo.")
     print("----------------------------------------")
 
+@app.cli.command("process-posters")
+def process_posters_command():
+    """Memindahkan poster lama ke nama hash konten dan membuat varian yang belum ada."""
+    converted = written = 0
+    for event in Event.query.filter(Event.image_filename.isnot(None)).all():
+        path = os.path.join(app.config['UPLOAD_FOLDER'], event.image_filename)
+        if not os.path.exists(path):
+            print(f"Poster event {event.id} tidak ditemukan: {event.image_filename}")
+            continue
+        if not event.image_filename.startswith(POSTER_DIR + '/'):
+            with open(path, 'rb') as f:
+                event.image_filename = store_poster(f.read(), event.image_filename)
+            path = os.path.join(app.config['UPLOAD_FOLDER'], event.image_filename)
+            converted += 1
+        written += generate_poster_variants(path)
+    db.session.commit()
+    print(f"{converted} poster dipindahkan ke nama hash, {written} file varian dibuat.")
+
+@app.cli.command("recount-events")
+def recount_events_command():
+    """Membangun ulang counter registered_count & checked_in_count semua event."""
+    updated = recount_event_counters()
+    print(f"Counter peserta untuk {updated} event berhasil dihitung ulang.")
+
 if __name__ == '__main__':
     if not os.path.exists(os.path.join(base_dir, 'instance')): os.makedirs(os.path.join(base_dir, 'instance'))
     if not os.path.exists(UPLOAD_FOLDER): os.makedirs(UPLOAD_FOLDER)
     app.run(debug=True, host='0.0.0.0')
 
-import seed
\ No newline at end of file
+import seed
+import migrations
+import bench
@@ -0,0 +1,348 @@
+from app import app, db, User, Event, Ticket, BusinessProfile, UserTestScore, EventQuestion, EXPORT_COLUMNS, EXPORT_CHUNK_SIZE
+from app import QUERY_BUDGETS, QueryBudgetExceeded, _identity_cache, _identity_cache_lock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+from time import perf_counter
+import click
+import json
+import subprocess
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Benchmark endpoint utama terhadap dataset yang sedang terpasang (biasanya hasil 'flask seed-load').
+# Mode default memakai Flask test client di proses yang sama sehingga jumlah SQL per request
+# bisa dihitung lewat event engine. Dengan --base-url, request dikirim lewat HTTP ke server
+# lokal (mis. gunicorn) dan login memakai password '123' dari seed-load; jumlah SQL tidak
+# tersedia di mode ini.
+# PERHATIAN: skenario buy/checkin/scan MENGUBAH data (membuat tiket & check-in).
+
+BENCH_ENDPOINTS = ['public_events', 'events', 'tickets_buy', 'checkin', 'panitia_scan', 'user_tickets', 'reports', 'download_csv']
+
+_sql_counter = threading.local()
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    _sql_counter.count = getattr(_sql_counter, 'count', 0) + 1
+
+def percentile(sorted_values, pct):
+    """Percentile nearest-rank dari list yang sudah terurut."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def test_client_transport():
+    clients = {}
+    lock = threading.Lock()
+
+    def client_for(user_id):
+        key = (threading.get_ident(), user_id)
+        with lock:
+            client = clients.get(key)
+        if client is None:
+            client = app.test_client()
+            if user_id:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+            with lock:
+                clients[key] = client
+        return client
+
+    def send(method, path, user_id=None, json_body=None, form=None):
+        client = client_for(user_id)
+        _sql_counter.count = 0
+        started = perf_counter()
+        response = client.open(path, method=method, json=json_body, data=form)
+        response.get_data()
+        elapsed = perf_counter() - started
+        return response.status_code, elapsed, _sql_counter.count
+
+    return send
+
+def http_transport(base_url, emails):
+    """Login semua user uji lebih dulu agar waktu bcrypt tidak ikut terukur."""
+    def login(email):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        request = urllib.request.Request(
+            base_url + '/api/login', data=json.dumps({'login_identifier': email, 'password': '123'}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        opener.open(request, timeout=30).read()
+        return opener
+
+    openers = {user_id: login(email) for user_id, email in emails.items()}
+    openers[None] = urllib.request.build_opener()
+
+    def send(method, path, user_id=None, json_body=None, form=None):
+        opener = openers[user_id]
+        data, headers = None, {}
+        if json_body is not None:
+            data, headers = json.dumps(json_body).encode('utf-8'), {'Content-Type': 'application/json'}
+        elif form is not None:
+            data = urllib.parse.urlencode(form, doseq=True).encode('utf-8')
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        started = perf_counter()
+        try:
+            with opener.open(urllib.request.Request(base_url + path, data=data, headers=headers, method=method), timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        return status, perf_counter() - started, None
+
+    return send
+
+def prepare_scenarios(count):
+    """Memilih data uji dari database dan menyusun daftar request untuk tiap endpoint."""
+    now = datetime.utcnow()
+    admin_id = db.session.query(User.id).filter(User.role == 'admin').order_by(User.id).scalar()
+    panitia_id = db.session.query(User.id).filter(User.role == 'panitia').order_by(User.id).scalar() or admin_id
+    busiest_user_id = db.session.query(Ticket.user_id).join(User, Ticket.user_id == User.id).filter(
+        User.role == 'user'
+    ).group_by(Ticket.user_id).order_by(db.func.count(Ticket.id).desc()).limit(1).scalar()
+    busiest_event = Event.query.order_by(Event.registered_count.desc(), Event.id).first()
+    if not (admin_id and busiest_user_id and busiest_event):
+        raise click.ClickException("Dataset kosong. Jalankan 'flask seed-load' terlebih dahulu.")
+
+    open_event = Event.query.filter(
+        Event.tgl_buka_pendaftaran <= now, Event.tgl_tutup_pendaftaran >= now, Event.is_archived == False,
+        Event.price == 0, Event.is_umkm_data_required == False
+    ).order_by((Event.slot_peserta - Event.registered_count).desc(), Event.id).first()
+    buyers = []
+    if open_event:
+        registered = db.select(Ticket.user_id).where(Ticket.event_id == open_event.id)
+        buyers = [row[0] for row in db.session.query(User.id).filter(
+            User.role == 'user', User.is_verified == True, User.id.notin_(registered)
+        ).order_by(User.id).limit(count)]
+
+    scan_event = db.session.query(Ticket.event_id).filter(Ticket.is_checked_in == False).group_by(
+        Ticket.event_id
+    ).order_by(db.func.count(Ticket.id).desc()).limit(1).scalar()
+    codes = [row[0] for row in db.session.query(Ticket.ticket_code).filter(
+        Ticket.event_id == scan_event, Ticket.is_checked_in == False
+    ).order_by(Ticket.id).limit(count * 2)] if scan_event else []
+
+    month = busiest_event.tgl_mulai_event
+    export_form = {'columns': list(EXPORT_COLUMNS.keys())}
+
+    scenarios = {
+        'public_events': [('GET', '/api/public/events', None, None, None)] * count,
+        'events': [('GET', '/api/events', busiest_user_id, None, None)] * count,
+        'tickets_buy': [('POST', '/api/tickets/buy', user_id, {'event_id': open_event.id}, None) for user_id in buyers],
+        'checkin': [('POST', '/api/checkin', admin_id, {'ticket_code': code, 'event_id': scan_event}, None) for code in codes[:count]],
+        'panitia_scan': [('POST', '/api/mobile/panitia/scan', panitia_id, {'ticket_code': code}, None) for code in codes[count:]],
+        'user_tickets': [('GET', f'/api/users/{busiest_user_id}/tickets', busiest_user_id, None, None)] * count,
+        'reports': [('GET', f'/reports?month={month.month}&year={month.year}', admin_id, None, None)] * count,
+        'download_csv': [('POST', f'/event/{busiest_event.id}/download-csv', admin_id, None, export_form)] * count,
+    }
+    warmups = {
+        'checkin': ('GET', f'/event/{scan_event}/scanner', admin_id, None, None) if scan_event else None,
+    }
+    user_ids = {admin_id, panitia_id, busiest_user_id, *buyers}
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids)).all())
+    db.session.remove()
+    return scenarios, warmups, emails
+
+def run_scenario(executor, send, requests):
+    started = perf_counter()
+    results = list(executor.map(lambda r: run_request(send, r), requests))
+    wall = perf_counter() - started
+
+    latencies = sorted(elapsed for _, elapsed, _ in results)
+    sql_counts = [sql for _, _, sql in results if sql is not None]
+    status_counts = {}
+    for status, _, _ in results:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(results),
+        'status_counts': status_counts,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(results) / wall, 2) if results and wall else None,
+        'sql_per_request_mean': round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else None,
+        'sql_per_request_max': max(sql_counts) if sql_counts else None,
+    }
+
+def run_request(send, request_spec):
+    method, path, user_id, json_body, form = request_spec
+    return send(method, path, user_id=user_id, json_body=json_body, form=form)
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def print_comparison(report, baseline):
+    print(f"\nPerbandingan dengan {baseline.get('commit') or 'baseline'}:")
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for key in ['p50_ms', 'p95_ms', 'p99_ms', 'sql_per_request_mean']:
+            if before.get(key) and result.get(key) is not None:
+                parts.append(f"{key} {before[key]} -> {result[key]} ({(result[key] - before[key]) / before[key] * 100:+.1f}%)")
+        print(f"  {name:<14} " + ', '.join(parts))
+
+@app.cli.command("bench")
+@click.option('--requests', 'request_count', default=200, show_default=True, help='Jumlah request per endpoint.')
+@click.option('--warmup', default=5, show_default=True, help='Request pemanasan per endpoint baca (tidak diukur).')
+@click.option('--concurrency', default=1, show_default=True, help='Jumlah worker paralel.')
+@click.option('--endpoint', 'endpoints', multiple=True, type=click.Choice(BENCH_ENDPOINTS), help='Batasi ke endpoint tertentu (bisa diulang).')
+@click.option('--base-url', default=None, help='Kirim request lewat HTTP ke server ini (mis. http://127.0.0.1:5000).')
+@click.option('--output', default='bench-report.json', show_default=True, help='Path laporan JSON.')
+@click.option('--compare', 'compare_path', default=None, help='Laporan JSON sebelumnya untuk dibandingkan.')
+def bench_command(request_count, warmup, concurrency, endpoints, base_url, output, compare_path):
+    """Mengukur latency p50/p95/p99, throughput, dan jumlah SQL per request untuk endpoint utama."""
+    scenarios, warmups, emails = prepare_scenarios(request_count)
+    send = http_transport(base_url.rstrip('/'), emails) if base_url else test_client_transport()
+    if not base_url:
+        db.event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat() + 'Z',
+        'commit': current_commit(),
+        'mode': 'http' if base_url else 'test_client',
+        'database': db.engine.dialect.name,
+        'dataset': {
+            'users': db.session.query(db.func.count(User.id)).scalar(),
+            'events': db.session.query(db.func.count(Event.id)).scalar(),
+            'tickets': db.session.query(db.func.count(Ticket.id)).scalar(),
+        },
+        'requests_per_endpoint': request_count,
+        'concurrency': concurrency,
+        'results': {},
+    }
+    db.session.remove()
+
+    # Request selalu dijalankan di thread worker: app context milik CLI (beserta g & sesi DB)
+    # tidak ikut terbawa, jadi setiap request mendapat context sendiri seperti di server.
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for name in endpoints or BENCH_ENDPOINTS:
+            requests = scenarios[name]
+            if not requests:
+                print(f"  {name:<14} dilewati (tidak ada data uji yang cocok)")
+                continue
+            if warmups.get(name):
+                executor.submit(run_request, send, warmups[name]).result()
+            elif requests[0][0] == 'GET' or name == 'download_csv':
+                list(executor.map(lambda r: run_request(send, r), requests[:warmup]))
+            result = run_scenario(executor, send, requests)
+            report['results'][name] = result
+            print(f"  {name:<14} n={result['requests']:<5} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"p99={result['p99_ms']}ms {result['throughput_rps']} req/s sql={result['sql_per_request_mean']} "
+                  f"status={result['status_counts']}")
+    finally:
+        executor.shutdown()
+        if not base_url:
+            db.event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Laporan disimpan ke {output}")
+
+    if compare_path:
+        with open(compare_path) as f:
+            print_comparison(report, json.load(f))
+
+def budget_probes(include_writes):
+    """Request uji untuk setiap endpoint di QUERY_BUDGETS, memakai event/user terbesar agar N+1 terlihat."""
+    now = datetime.utcnow()
+    admin_id = db.session.query(User.id).filter(User.role == 'admin').order_by(User.id).scalar()
+    panitia_id = db.session.query(User.id).filter(User.role == 'panitia').order_by(User.id).scalar() or admin_id
+    user_id = db.session.query(Ticket.user_id).group_by(Ticket.user_id).order_by(db.func.count(Ticket.id).desc()).limit(1).scalar()
+    busiest_event = Event.query.order_by(Event.registered_count.desc(), Event.id).first()
+    export_event_id = db.session.query(Event.id).filter(
+        Event.registered_count > 0, Event.registered_count <= EXPORT_CHUNK_SIZE
+    ).order_by(Event.registered_count.desc()).limit(1).scalar()
+    if not (admin_id and user_id and busiest_event):
+        raise click.ClickException("Dataset kosong. Jalankan 'flask seed-db' atau 'flask seed-load' terlebih dahulu.")
+    owner_id = db.session.query(BusinessProfile.user_id).order_by(BusinessProfile.id).limit(1).scalar() or user_id
+    score = UserTestScore.query.order_by(UserTestScore.id).first()
+    test_event_id = db.session.query(EventQuestion.event_id).order_by(EventQuestion.event_id).limit(1).scalar()
+
+    probes = [
+        ('dashboard', 'GET', '/?per_page=10', admin_id, None, None),
+        ('dashboard', 'GET', '/?per_page=100', admin_id, None, None),
+        ('dashboard', 'GET', f'/?per_page=100&search={busiest_event.title.split()[0]}', admin_id, None, None),
+        ('archived_events_list', 'GET', '/archive?per_page=100', admin_id, None, None),
+        ('event_detail', 'GET', f'/event/{busiest_event.id}', admin_id, None, None),
+        ('panitia_dashboard', 'GET', '/panitia/dashboard', panitia_id, None, None),
+        ('reports', 'GET', f'/reports?month={busiest_event.tgl_mulai_event.month}&year={busiest_event.tgl_mulai_event.year}', admin_id, None, None),
+        ('test_analytics', 'GET', '/reports/test-analytics?year=0', admin_id, None, None),
+        ('download_monthly_report', 'GET', f'/reports/download?month={busiest_event.tgl_mulai_event.month}&year={busiest_event.tgl_mulai_event.year}', admin_id, None, None),
+        ('public_get_events', 'GET', '/api/public/events', None, None, None),
+        ('get_events', 'GET', '/api/events', user_id, None, None),
+        ('get_user_tickets', 'GET', f'/api/users/{user_id}/tickets', user_id, None, None),
+        ('get_user_details_admin', 'GET', f'/api/admin/user/{owner_id}/details' + (f'?event_id={score.event_id}' if score else ''), admin_id, None, None),
+    ]
+    if test_event_id:
+        probes.append(('get_test_questions_api', 'GET', f'/api/events/{test_event_id}/test/questions', user_id, None, None))
+    if export_event_id:
+        probes.append(('download_csv', 'POST', f'/event/{export_event_id}/download-csv', admin_id, None, {'columns': list(EXPORT_COLUMNS.keys())}))
+
+    if include_writes:
+        open_event = Event.query.filter(
+            Event.tgl_buka_pendaftaran <= now, Event.tgl_tutup_pendaftaran >= now, Event.is_archived == False, Event.price == 0
+        ).order_by((Event.slot_peserta - Event.registered_count).desc(), Event.id).first()
+        if open_event:
+            buyer_id = db.session.query(User.id).filter(
+                User.role == 'user', User.id.notin_(db.select(Ticket.user_id).where(Ticket.event_id == open_event.id))
+            ).order_by(User.id).limit(1).scalar()
+            if buyer_id:
+                probes.append(('buy_ticket', 'POST', '/api/tickets/buy', buyer_id, {'event_id': open_event.id}, None))
+        codes = [row[0] for row in db.session.query(Ticket.ticket_code).filter(Ticket.is_checked_in == False).order_by(Ticket.id).limit(2)]
+        if codes:
+            probes.append(('check_in', 'POST', '/api/checkin', admin_id, {'ticket_code': codes[0]}, None))
+        if len(codes) > 1:
+            probes.append(('mobile_panitia_scan', 'POST', '/api/mobile/panitia/scan', panitia_id, {'ticket_code': codes[1]}, None))
+        if test_event_id:
+            probes.append(('submit_test_api', 'POST', f'/api/events/{test_event_id}/test/submit', user_id, {'answers': {'1': 'A'}}, None))
+    db.session.remove()
+    return probes
+
+@app.cli.command("check-query-budgets")
+@click.option('--include-writes', is_flag=True, help='Ikut menguji buy/check-in/scan (MENGUBAH data).')
+def check_query_budgets_command(include_writes):
+    """Menjalankan setiap endpoint di QUERY_BUDGETS dan gagal bila ada yang melebihi anggaran query."""
+    probes = budget_probes(include_writes)
+    app.config['QUERY_BUDGETS_ENFORCED'] = True
+    send = test_client_transport()
+    failures = 0
+
+    def probe(spec):
+        endpoint, method, path, user_id, json_body, form = spec
+        # Cache identitas dikosongkan agar query user_loader ikut dihitung (kasus terburuk).
+        with _identity_cache_lock:
+            _identity_cache.clear()
+        try:
+            status, _, statements = send(method, path, user_id=user_id, json_body=json_body, form=form)
+            return f"  OK    {endpoint:<24} {statements}/{QUERY_BUDGETS[endpoint]} query  [{status}] {method} {path}"
+        except QueryBudgetExceeded as e:
+            return e
+
+    db.event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for result in executor.map(probe, probes):
+                if isinstance(result, QueryBudgetExceeded):
+                    failures += 1
+                    print(f"  GAGAL {result}")
+                else:
+                    print(result)
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    if failures:
+        raise click.ClickException(f"{failures} endpoint melebihi anggaran query.")
+    print("Semua endpoint dalam anggaran query.")
@@ -0,0 +1,179 @@
+from app import app, db, Event, OutboundEmail, ReportSnapshot, recount_event_counters, create_event_search_index
+from app import EVENT_SEARCH_POSTGRES_DDL, EVENT_SEARCH_POSTGRES_INDEXES, EVENT_SEARCH_VECTOR_SQL
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+import click
+
+# Migrasi skema berversi untuk database yang sudah berjalan (PostgreSQL & SQLite).
+# Setiap langkah idempoten (IF NOT EXISTS / cek kolom), jadi aman dijalankan ulang
+# bila sempat terhenti di tengah. Index di PostgreSQL dibuat CONCURRENTLY agar
+# tabel tetap bisa dibaca & ditulis selama upgrade.
+
+HOT_PATH_INDEXES = [
+    ('event', ['ix_event_archived_start', 'ix_event_start']),
+    ('event_question', ['ix_event_question_event_number']),
+    ('ticket', ['ix_ticket_event_checked']),
+    ('user_test_score', ['ix_user_test_score_user_event']),
+    ('check_in', ['ix_check_in_ticket_id']),
+    ('business_profile', ['ix_business_profile_user_id']),
+    ('business_marketplace', ['ix_business_marketplace_business_id']),
+    ('business_license', ['ix_business_license_business_id']),
+    ('business_finance', ['ix_business_finance_business_id']),
+    ('business_npwp', ['ix_business_npwp_business_id']),
+    ('business_funding', ['ix_business_funding_business_id']),
+    ('outbound_email', ['ix_outbound_email_due']),
+]
+
+def invalid_index_exists(conn, index_name):
+    """PostgreSQL: True bila index ada tapi INVALID (sisa CREATE INDEX CONCURRENTLY yang gagal)."""
+    return conn.execute(
+        text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {'name': index_name}
+    ).scalar() is True
+
+def create_index(conn, table_name, columns, index_name, unique=False, using=None):
+    """`columns` berisi nama kolom atau (nama kolom, operator class), mis. ('title', 'gin_trgm_ops')."""
+    preparer = conn.dialect.identifier_preparer
+    postgresql = conn.dialect.name == 'postgresql'
+    concurrently = 'CONCURRENTLY ' if postgresql else ''
+    column_list = ', '.join(
+        f"{preparer.quote(c[0])} {c[1] or ''}".rstrip() if isinstance(c, tuple) else preparer.quote(c)
+        for c in columns
+    )
+    drop_invalid = f"DROP INDEX CONCURRENTLY IF EXISTS {preparer.quote(index_name)}"
+
+    # IF NOT EXISTS akan melewati index INVALID, jadi sisa build gagal dibuang dulu.
+    if postgresql and invalid_index_exists(conn, index_name):
+        print(f"  Index {index_name} tidak valid (build sebelumnya gagal), dibuat ulang.")
+        conn.execute(text(drop_invalid))
+    try:
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {concurrently}IF NOT EXISTS {preparer.quote(index_name)} "
+            f"ON {preparer.quote(table_name)} {f'USING {using} ' if using else ''}({column_list})"
+        ))
+    except DBAPIError as e:
+        if postgresql and invalid_index_exists(conn, index_name):
+            conn.execute(text(drop_invalid))
+        hint = ' Hapus baris duplikat terlebih dahulu.' if unique else ''
+        raise click.ClickException(
+            f"Gagal membuat index {index_name} pada {table_name}: {e.orig}.{hint} Migrasi tidak ditandai selesai."
+        )
+
+def add_missing_columns(conn, model_class, column_names):
+    existing = {c['name'] for c in inspect(conn).get_columns(model_class.__tablename__)}
+    preparer = conn.dialect.identifier_preparer
+    for name in column_names:
+        if name in existing:
+            continue
+        column = model_class.__table__.c[name]
+        ddl = f"ALTER TABLE {preparer.quote(model_class.__tablename__)} ADD COLUMN {preparer.quote(name)} {column.type.compile(conn.dialect)}"
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+        conn.execute(text(ddl))
+
+def migrate_0001_event_counters_and_mail_queue(conn):
+    """Counter peserta & updated_at di Event, unique tiket per user, dan tabel antrean email."""
+    add_missing_columns(conn, Event, ['registered_count', 'checked_in_count', 'updated_at'])
+    create_index(conn, 'ticket', ['user_id', 'event_id'], 'uq_ticket_user_event', unique=True)
+    OutboundEmail.__table__.create(conn, checkfirst=True)
+
+def migrate_0002_hot_path_indexes(conn):
+    """Index untuk semua pola query di route (listing, scanner, export, laporan, antrean email)."""
+    for table_name, index_names in HOT_PATH_INDEXES:
+        indexes = {index.name: index for index in db.metadata.tables[table_name].indexes}
+        for index_name in index_names:
+            create_index(conn, table_name, [c.name for c in indexes[index_name].columns], index_name)
+
+SEARCH_BACKFILL_BATCH = 1000
+
+def backfill_event_search_vectors(conn):
+    """Mengisi search_vector baris lama per batch id (tiap batch commit sendiri, lock baris singkat)."""
+    last_id, total = 0, 0
+    while True:
+        ids = [row[0] for row in conn.execute(text(
+            f"UPDATE event SET search_vector = {EVENT_SEARCH_VECTOR_SQL.format(row='')} "
+            "WHERE id IN (SELECT id FROM event WHERE id > :after ORDER BY id LIMIT :batch) RETURNING id"
+        ), {'after': last_id, 'batch': SEARCH_BACKFILL_BATCH})]
+        if not ids:
+            return total
+        last_id = max(ids)
+        total += len(ids)
+
+def migrate_0003_event_search_index(conn):
+    """Index pencarian event: tsvector + pg_trgm (PostgreSQL) atau FTS5 (SQLite)."""
+    if conn.dialect.name != 'postgresql':
+        create_event_search_index(conn)
+        return
+    # Kolom nullable tanpa default tidak me-rewrite tabel; trigger mengisi baris baru/berubah,
+    # baris lama di-backfill bertahap, lalu index GIN dibangun CONCURRENTLY.
+    for statement in EVENT_SEARCH_POSTGRES_DDL:
+        conn.exec_driver_sql(statement)
+    print(f"  {backfill_event_search_vectors(conn)} event di-backfill.")
+    for index_name, columns in EVENT_SEARCH_POSTGRES_INDEXES:
+        create_index(conn, 'event', columns, index_name, using='gin')
+
+def migrate_0004_report_snapshots(conn):
+    """Tabel snapshot laporan bulanan per (tahun, bulan, event)."""
+    ReportSnapshot.__table__.create(conn, checkfirst=True)
+
+def migrate_0005_event_questions_version(conn):
+    """Versi soal per event untuk validasi cache soal lintas worker."""
+    add_missing_columns(conn, Event, ['questions_version'])
+
+MIGRATIONS = [
+    ('0001_event_counters_and_mail_queue', migrate_0001_event_counters_and_mail_queue),
+    ('0002_hot_path_indexes', migrate_0002_hot_path_indexes),
+    ('0003_event_search_index', migrate_0003_event_search_index),
+    ('0004_report_snapshots', migrate_0004_report_snapshots),
+    ('0005_event_questions_version', migrate_0005_event_questions_version),
+]
+
+def ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def applied_versions(conn):
+    ensure_migrations_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def record_version(conn, version):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+        {'version': version, 'applied_at': datetime.utcnow()}
+    )
+
+def stamp_all_migrations():
+    """Menandai semua migrasi sudah diterapkan (dipakai init-db, karena create_all sudah memuat skema terbaru)."""
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        done = applied_versions(conn)
+        for version, _ in MIGRATIONS:
+            if version not in done:
+                record_version(conn, version)
+
+@app.cli.command("db-upgrade")
+def db_upgrade_command():
+    """Menjalankan migrasi skema yang belum diterapkan, tanpa menghapus data."""
+    applied = []
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        done = applied_versions(conn)
+        for version, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Menerapkan migrasi {version}...")
+            migrate(conn)
+            record_version(conn, version)
+            applied.append(version)
+
+    if any(version.startswith('0001') for version in applied):
+        recount_event_counters()
+
+    print(f"Selesai. {len(applied)} migrasi diterapkan." if applied else "Skema sudah versi terbaru.")
+
+@app.cli.command("db-status")
+def db_status_command():
+    """Menampilkan status setiap migrasi skema."""
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        done = applied_versions(conn)
+    for version, migrate in MIGRATIONS:
+        print(f"[{'x' if version in done else ' '}] {version} - {migrate.__doc__}")
@@ -1,26 +1,25 @@
 from app import app, db, User, Event, Ticket, CheckIn, LOCAL_TZ, pytz
 from app import BusinessProfile, BusinessMarketplace, BusinessLicense, BusinessFinance, BusinessNPWP, BusinessFunding
-from app import EventQuestion, UserTestScore 
+from app import EventQuestion, UserTestScore, ReportSnapshot
+from app import recount_event_counters, bcrypt
 from datetime import datetime, timedelta, time
+import click
+import io
+import random
+import uuid
+
+def clear_all_data():
+    """Menghapus semua data peserta, event, dan UMKM (urutan mengikuti foreign key)."""
+    for model_class in [ReportSnapshot, UserTestScore, EventQuestion, CheckIn, Ticket, BusinessMarketplace, BusinessLicense,
+                        BusinessFinance, BusinessNPWP, BusinessFunding, Event, BusinessProfile, User]:
+        model_class.query.delete()
+    db.session.commit()
 
 @app.cli.command("seed-db")
 def seed_db_command():
     """Mengisi database dengan data demo lengkap untuk showcase."""
     
-    UserTestScore.query.delete()
-    EventQuestion.query.delete()
-    CheckIn.query.delete()
-    Ticket.query.delete()
-    BusinessMarketplace.query.delete()
-    BusinessLicense.query.delete()
-    BusinessFinance.query.delete()
-    BusinessNPWP.query.delete()
-    BusinessFunding.query.delete()
-    Event.query.delete()
-    BusinessProfile.query.delete()
-    User.query.delete()
-    
-    db.session.commit()
+    clear_all_data()
     print("Data lama berhasil dibersihkan.")
 
     user_felix = User(id=1, okoce_id='10000001', name='Felix (Admin)', phone_number='08111111111', email='felix@admin.com', province='DKI JAKARTA', city='KOTA JAKARTA TIMUR', institution='OK OCE', has_business=True, role='admin', is_verified=True)
@@ -148,6 +147,241 @@ def seed_db_command():
     db.session.add_all([q1, q2, q3, q4, q5])
     db.session.commit()
 
+    recount_event_counters()
+
     print("Event demo & Soal Test berhasil dibuat.")
     print("----------------------------------------")
-    print("Database seeding selesai!")
\ No newline at end of file
+    print("Database seeding selesai!")
+
+# --- Data sintetis skala besar untuk load test / benchmark ---
+# Semua nilai diturunkan dari satu random.Random(seed), dan tanggal dihitung relatif
+# terhadap tengah malam UTC hari ini, jadi seed yang sama selalu menghasilkan
+# dataset yang sama bentuknya. Semua akun memakai password '123';
+# admin@load.test (admin) dan panitia@load.test (panitia) adalah user id 1 & 2.
+
+LOAD_PROVINCES = [
+    ('DKI JAKARTA', ['KOTA JAKARTA TIMUR', 'KOTA JAKARTA SELATAN', 'KOTA JAKARTA BARAT']),
+    ('JAWA BARAT', ['KOTA BANDUNG', 'KOTA BEKASI', 'KOTA BOGOR']),
+    ('JAWA TENGAH', ['KOTA SEMARANG', 'KOTA SURAKARTA']),
+    ('JAWA TIMUR', ['KOTA SURABAYA', 'KOTA MALANG']),
+    ('BANTEN', ['KOTA TANGERANG', 'KOTA SERANG']),
+]
+LOAD_INSTITUTIONS = ['OK OCE', 'BINUS', 'UI', 'ITB', 'UNDIP', 'ITS', None]
+LOAD_BUSINESS_TYPES = ['Makanan dan Minuman', 'Fashion', 'Teknologi', 'Kerajinan', 'Jasa', 'Pertanian']
+LOAD_TOPICS = ['Digital Marketing', 'Pendanaan UMKM', 'Laporan Keuangan', 'Ekspor', 'Branding', 'Legalitas Usaha']
+LOAD_SPEAKERS = ['Felix', 'Dewa', 'Bayu', 'Citra', 'Rayyan', 'Sandiaga', 'Indra']
+LOAD_OMZET_RANGES = ['< Rp 300.000.000', 'Rp 300.000.000 - Rp 2.500.000.000', '< Rp 2.000.000.000']
+LOAD_EMPLOYEE_COUNTS = ['1 Orang', '2 - 10 Orang', '11 - 50 Orang']
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def bulk_insert(model_class, rows):
+    """Insert massal satu batch baris (list of dict): COPY di PostgreSQL, executemany di engine lain."""
+    if not rows:
+        return
+    if db.engine.dialect.name != 'postgresql':
+        db.session.execute(db.insert(model_class), rows)
+        db.session.commit()
+        return
+
+    columns = list(rows[0].keys())
+    preparer = db.engine.dialect.identifier_preparer
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row[c]) for c in columns) + '\n')
+    buffer.seek(0)
+    raw = db.engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {preparer.quote(model_class.__tablename__)} ({', '.join(preparer.quote(c) for c in columns)}) FROM STDIN", buffer
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+def write_batches(model_class, rows, batch_size):
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            bulk_insert(model_class, batch)
+            total += len(batch)
+            batch = []
+    bulk_insert(model_class, batch)
+    return total + len(batch)
+
+def reset_id_sequences(model_classes):
+    """Menyamakan sequence id PostgreSQL setelah insert dengan id eksplisit."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model_class in model_classes:
+        table = model_class.__tablename__
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+        ))
+    db.session.commit()
+
+def generate_users(rng, count, business_owner_ids, password_hash, created_at):
+    for user_id in range(1, count + 1):
+        province, cities = rng.choice(LOAD_PROVINCES)
+        role = {1: 'admin', 2: 'panitia'}.get(user_id, 'user')
+        yield {
+            'id': user_id, 'okoce_id': str(20000000 + user_id), 'name': f'Peserta Load {user_id}',
+            'phone_number': f'089{user_id:09d}', 'email': f'{role}@load.test' if user_id <= 2 else f'user{user_id}@load.test',
+            'province': province, 'city': rng.choice(cities), 'institution': rng.choice(LOAD_INSTITUTIONS),
+            'has_business': user_id in business_owner_ids, 'password_hash': password_hash, 'role': role,
+            'is_verified': rng.random() < 0.95, 'privacy_accepted_at': created_at,
+        }
+
+def generate_businesses(owner_ids):
+    for business_id, user_id in enumerate(owner_ids, start=1):
+        yield {
+            'id': business_id, 'user_id': user_id, 'business_name': f'Usaha Load {business_id}',
+            'business_type': LOAD_BUSINESS_TYPES[business_id % len(LOAD_BUSINESS_TYPES)],
+            'address_same_as_home': business_id % 3 == 0, 'premise_status': 'Milik Sendiri' if business_id % 2 else 'Sewa',
+            'legal_entity': 'Perseorangan', 'has_license': True, 'has_npwp': True, 'has_funding': business_id % 4 == 0,
+            'financial_report_type': 'Aplikasi' if business_id % 5 == 0 else 'Manual',
+            'report_laba_rugi': True, 'report_neraca': business_id % 2 == 0, 'report_arus_kas': False,
+            'business_phone': f'087{business_id:09d}', 'business_email': f'usaha{business_id}@load.test',
+            'operating_since': str(2015 + business_id % 10),
+        }
+
+def generate_business_records(rng, business_count):
+    """Menghasilkan (model, row) untuk semua sub-record UMKM: marketplace, izin, keuangan, NPWP, pendanaan."""
+    for business_id in range(1, business_count + 1):
+        for index in range(rng.randint(1, 2)):
+            yield BusinessMarketplace, {'business_id': business_id, 'marketplace_type': ['Website', 'Tokopedia', 'Shopee'][index],
+                                        'url': f'https://usaha{business_id}.load.test/{index}'}
+        yield BusinessLicense, {'business_id': business_id, 'license_type': 'NIB', 'license_number': f'{business_id:013d}'}
+        for year in range(2025 - rng.randint(1, 3), 2025):
+            yield BusinessFinance, {'business_id': business_id, 'year': str(year), 'omzet_range': rng.choice(LOAD_OMZET_RANGES),
+                                    'profit': rng.randint(1, 500) * 1000000, 'asset_value': rng.randint(1, 900) * 1000000,
+                                    'employee_count': rng.choice(LOAD_EMPLOYEE_COUNTS)}
+        yield BusinessNPWP, {'business_id': business_id, 'npwp_number': f'{business_id:015d}', 'report_receipt_number': f'BPE{business_id}',
+                             'year': '2024', 'submission_date': '2025-03-01'}
+        if business_id % 4 == 0:
+            yield BusinessFunding, {'business_id': business_id, 'funder_type': 'BANK', 'funder_name': rng.choice(['BCA', 'BRI', 'Mandiri']),
+                                    'amount': rng.randint(10, 500) * 1000000, 'received_date': '2024-01-01'}
+
+def plan_ticket_counts(rng, event_count, ticket_count, user_count):
+    weights = [rng.uniform(0.2, 1.8) for _ in range(event_count)]
+    total_weight = sum(weights)
+    return [min(user_count, round(ticket_count * w / total_weight)) for w in weights]
+
+def generate_events(rng, ticket_counts, anchor):
+    """Event tersebar ±1 tahun dari anchor; sebagian wajib UMKM, sebagian memakai pre/post test."""
+    for event_id, registered in enumerate(ticket_counts, start=1):
+        start = anchor + timedelta(days=rng.randint(-365, 180), hours=rng.choice([8, 9, 13, 19]))
+        is_online = rng.random() < 0.4
+        yield {
+            'id': event_id, 'sifat_pelatihan': rng.choice(['Umum', 'Wajib']),
+            'title': f'{rng.choice(LOAD_TOPICS)} Batch {event_id}', 'jenis_event': 'Public' if rng.random() < 0.7 else 'Private',
+            'tempat_event': 'Online' if is_online else 'Offline - OK OCE HQ', 'pic_event': 'Admin',
+            'narasumber': rng.choice(LOAD_SPEAKERS), 'slot_peserta': registered + rng.randint(0, 200),
+            'description': f'Pelatihan {event_id} untuk pelaku UMKM OK OCE.', 'price': 0,
+            'tgl_buka_pendaftaran': start - timedelta(days=30), 'tgl_tutup_pendaftaran': start - timedelta(days=1),
+            'tgl_mulai_event': start, 'tgl_selesai_event': start + timedelta(hours=3),
+            'is_umkm_data_required': rng.random() < 0.2, 'is_archived': rng.random() < 0.05,
+            'online_event_url': f'https://zoom.us/j/{event_id:010d}' if is_online else None,
+            'has_pre_post_test': rng.random() < 0.2, 'is_post_test_open_manually': False,
+            'registered_count': 0, 'checked_in_count': 0, 'updated_at': anchor,
+        }
+
+def generate_questions(test_event_ids):
+    for event_id in test_event_ids:
+        for number in range(1, 6):
+            yield {'event_id': event_id, 'question_number': number, 'question_text': f'Soal {number} event {event_id}?',
+                   'option_a': 'Pilihan A', 'option_b': 'Pilihan B', 'option_c': 'Pilihan C', 'option_d': 'Pilihan D',
+                   'correct_answer': 'ABCD'[(event_id + number) % 4]}
+
+@app.cli.command("seed-load")
+@click.option('--users', default=200000, show_default=True, help='Jumlah user.')
+@click.option('--businesses', default=20000, show_default=True, help='Jumlah profil UMKM (beserta semua sub-record).')
+@click.option('--events', default=5000, show_default=True, help='Jumlah event.')
+@click.option('--tickets', default=2000000, show_default=True, help='Perkiraan total tiket.')
+@click.option('--scale', default=1.0, show_default=True, help='Pengali untuk semua volume di atas.')
+@click.option('--seed', default=42, show_default=True, help='Seed random agar dataset bisa direproduksi.')
+@click.option('--batch-size', default=10000, show_default=True, help='Jumlah baris per batch insert.')
+def seed_load_command(users, businesses, events, tickets, scale, seed, batch_size):
+    """Mengisi database dengan data sintetis skala besar (deterministik) untuk load test."""
+    users, businesses, events, tickets = (max(2, int(users * scale)), int(businesses * scale),
+                                          max(1, int(events * scale)), int(tickets * scale))
+    businesses = min(businesses, users)
+    rng = random.Random(seed)
+    anchor = datetime.combine(datetime.utcnow().date(), time())
+    started = datetime.utcnow()
+
+    clear_all_data()
+    print(f"Data lama dibersihkan. Membuat {users} user, {businesses} UMKM, {events} event, ~{tickets} tiket (seed={seed})...")
+
+    password_hash = bcrypt.generate_password_hash('123').decode('utf8')
+    business_owner_ids = sorted(rng.sample(range(1, users + 1), businesses))
+    write_batches(User, generate_users(rng, users, set(business_owner_ids), password_hash, anchor), batch_size)
+    write_batches(BusinessProfile, generate_businesses(business_owner_ids), batch_size)
+
+    pending = {}
+    sub_record_total = 0
+    for model_class, row in generate_business_records(rng, businesses):
+        rows = pending.setdefault(model_class, [])
+        rows.append(row)
+        if len(rows) >= batch_size:
+            bulk_insert(model_class, rows)
+            sub_record_total += len(rows)
+            pending[model_class] = []
+    for model_class, rows in pending.items():
+        bulk_insert(model_class, rows)
+        sub_record_total += len(rows)
+    print(f"User, UMKM & {sub_record_total} sub-record UMKM selesai.")
+
+    ticket_counts = plan_ticket_counts(rng, events, tickets, users)
+    event_rows = list(generate_events(rng, ticket_counts, anchor))
+    write_batches(Event, event_rows, batch_size)
+    test_event_ids = [e['id'] for e in event_rows if e['has_pre_post_test']]
+    write_batches(EventQuestion, generate_questions(test_event_ids), batch_size)
+
+    ticket_rows, check_in_rows, score_rows = [], [], []
+    totals = {'tickets': 0, 'check_ins': 0, 'scores': 0}
+
+    def flush():
+        # Tiket harus masuk lebih dulu karena check-in mereferensikan ticket.id.
+        for model_class, rows, key in [(Ticket, ticket_rows, 'tickets'), (CheckIn, check_in_rows, 'check_ins'),
+                                       (UserTestScore, score_rows, 'scores')]:
+            bulk_insert(model_class, rows)
+            totals[key] += len(rows)
+            rows.clear()
+
+    ticket_id = 0
+    for event, registered in zip(event_rows, ticket_counts):
+        is_past = event['tgl_mulai_event'] < anchor
+        for user_id in rng.sample(range(1, users + 1), registered):
+            ticket_id += 1
+            checked_in = is_past and rng.random() < 0.7
+            ticket_rows.append({'id': ticket_id, 'ticket_code': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                                'user_id': user_id, 'event_id': event['id'], 'is_checked_in': checked_in})
+            if checked_in:
+                check_in_rows.append({'ticket_id': ticket_id,
+                                      'timestamp': event['tgl_mulai_event'] + timedelta(minutes=rng.randint(-30, 60))})
+            if event['has_pre_post_test'] and is_past and rng.random() < 0.8:
+                pre = rng.randint(0, 5) * 20
+                post = min(100, pre + rng.randint(0, 3) * 20) if checked_in else None
+                score_rows.append({'user_id': user_id, 'event_id': event['id'], 'pre_test_score': pre, 'post_test_score': post,
+                                   'pre_test_submitted_at': event['tgl_mulai_event'] - timedelta(minutes=10),
+                                   'post_test_submitted_at': event['tgl_selesai_event'] if post is not None else None})
+        if len(ticket_rows) >= batch_size:
+            flush()
+    flush()
+
+    reset_id_sequences([User, BusinessProfile, BusinessMarketplace, BusinessLicense, BusinessFinance, BusinessNPWP,
+                        BusinessFunding, Event, EventQuestion, Ticket, CheckIn, UserTestScore])
+    recount_event_counters()
+
+    print(f"{totals['tickets']} tiket, {totals['check_ins']} check-in, {totals['scores']} skor test dibuat.")
+    print(f"Selesai dalam {(datetime.utcnow() - started).total_seconds():.1f} detik. Login: admin@load.test / 123")
@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import g
+from flask.testing import FlaskClient
+
+# Konfigurasi harus di-set sebelum `app` di-import (dibaca saat import).
+_db_dir = tempfile.mkdtemp(prefix='okoce-test-')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ['MAIL_QUEUE_WORKER'] = 'false'
+os.environ['MAIL_SERVER'] = '127.0.0.1'
+os.environ['MAIL_USE_TLS'] = 'false'
+os.environ['MAIL_SENDER'] = 'noreply@okoce.test'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from app import app as flask_app, db  # noqa: E402
+
+
+class TestClient(FlaskClient):
+    """
+    Request test memakai app context fixture (bukan context baru), jadi user Flask-Login yang
+    tersimpan di `g` dibuang dulu agar setiap client tetap login sebagai user-nya sendiri.
+    """
+    def open(self, *args, **kwargs):
+        g.pop('_login_user', None)
+        return super().open(*args, **kwargs)
+
+
+def reset_process_caches():
+    for cache in (app_module._identity_cache, app_module._question_cache, app_module._test_analytics_cache,
+                  app_module._event_count_cache, app_module._scanner_indexes):
+        cache.clear()
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    flask_app.test_client_class = TestClient
+    # Id dipakai ulang antar test, jadi semua cache per proses dikosongkan.
+    reset_process_caches()
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+def make_user(**fields):
+    from app import User
+    number = User.query.count() + 1
+    values = dict(
+        okoce_id=f'{number:08d}', name=f'User {number}', phone_number=f'0812{number:08d}',
+        email=f'user{number}@okoce.test', province='DKI JAKARTA', city='KOTA JAKARTA PUSAT',
+        password_hash='x', is_verified=True,
+    )
+    values.update(fields)
+    user = User(**values)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_event(**fields):
+    from datetime import datetime, timedelta
+    from app import Event
+    start = datetime.utcnow() + timedelta(days=7)
+    values = dict(
+        sifat_pelatihan='Umum', title='Pelatihan UMKM', jenis_event='Workshop', tempat_event='Online',
+        pic_event='PIC', narasumber='Narasumber', slot_peserta=100, description='Deskripsi',
+        tgl_buka_pendaftaran=start - timedelta(days=14), tgl_tutup_pendaftaran=start - timedelta(days=1),
+        tgl_mulai_event=start, tgl_selesai_event=start + timedelta(hours=3),
+    )
+    values.update(fields)
+    event = Event(**values)
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from conftest import make_user, make_event, login
+import app as app_module
+from app import db, Event, Ticket, CheckIn, recount_event_counters
+
+
+def test_batch_reports_each_scan_and_updates_counters(app):
+    app_module._scanner_indexes.clear()
+    event, other_event = make_event(), make_event(title='Event Lain')
+    panitia = make_user(role='panitia')
+    users = [make_user() for _ in range(4)]
+    fresh, second, used = (Ticket(user_id=user.id, event_id=event.id) for user in users[:3])
+    foreign = Ticket(user_id=users[3].id, event_id=other_event.id)
+    db.session.add_all([fresh, second, used, foreign])
+    db.session.commit()
+    used.is_checked_in = True
+    db.session.add(CheckIn(ticket_id=used.id, timestamp=datetime.utcnow()))
+    db.session.commit()
+    recount_event_counters()
+    client = app.test_client()
+    login(client, panitia)
+
+    scanned_at = datetime.utcnow() - timedelta(hours=2)
+    response = client.post('/api/checkin/batch', json={'event_id': str(event.id), 'scans': [
+        {'ticket_code': fresh.ticket_code, 'scanned_at': scanned_at.isoformat() + 'Z'},
+        {'ticket_code': used.ticket_code},
+        {'ticket_code': foreign.ticket_code},
+        {'ticket_code': 'TIDAK-ADA'},
+        {'ticket_code': second.ticket_code},
+        {'ticket_code': fresh.ticket_code},
+    ]})
+
+    assert response.status_code == 200
+    assert [r['result'] for r in response.json['results']] == [
+        'ok', 'already_used', 'wrong_event', 'invalid', 'ok', 'already_used'
+    ]
+    assert response.json['summary'] == {'ok': 2, 'already_used': 2, 'wrong_event': 1, 'invalid': 1}
+    db.session.expire_all()
+    assert (db.session.get(Event, event.id).registered_count, db.session.get(Event, event.id).checked_in_count) == (3, 3)
+    assert db.session.get(Event, other_event.id).checked_in_count == 0
+    assert not db.session.get(Ticket, foreign.id).is_checked_in
+    # Waktu scan asli dari perangkat yang disimpan, bukan waktu sinkronisasi.
+    assert CheckIn.query.filter_by(ticket_id=fresh.id).one().timestamp == scanned_at
+
+
+def test_batch_rejects_non_numeric_event_id(app):
+    panitia = make_user(role='panitia')
+    client = app.test_client()
+    login(client, panitia)
+
+    response = client.post('/api/checkin/batch', json={'event_id': 'abc', 'scans': [{'ticket_code': 'x'}]})
+
+    assert response.status_code == 400
+    assert response.json['status'] == 'error'
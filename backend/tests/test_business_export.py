@@ -0,0 +1,41 @@
+import csv
+import io
+
+from conftest import make_user, make_event, login
+from app import db, Ticket, BusinessProfile, BusinessMarketplace
+
+
+def add_business(user, name, marketplaces=()):
+    business = BusinessProfile(user_id=user.id, business_name=name, business_type='Kuliner')
+    db.session.add(business)
+    db.session.flush()
+    for marketplace_type in marketplaces:
+        db.session.add(BusinessMarketplace(business_id=business.id, marketplace_type=marketplace_type, url=f'https://{marketplace_type}.test'))
+    return business
+
+
+def test_export_and_admin_details_serialize_businesses(app):
+    event = make_event()
+    admin = make_user(role='admin')
+    owner, shop_owner, no_business = make_user(), make_user(), make_user()
+    add_business(owner, 'Warung Satu')
+    add_business(owner, 'Warung Kedua', marketplaces=['Tokopedia'])
+    add_business(shop_owner, 'Toko Online', marketplaces=['Shopee', 'Lazada'])
+    db.session.add_all([Ticket(user_id=user.id, event_id=event.id) for user in (owner, shop_owner, no_business)])
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+
+    response = client.post(f'/event/{event.id}/download-csv', data={'columns': ['Nama Peserta', 'Nama Bisnis', 'Marketplace']})
+
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    # Bisnis & sub-record pertama (id terkecil) tiap user; '-' bila tidak ada.
+    assert rows[1:] == [
+        [owner.name, 'Warung Satu', '-'],
+        [shop_owner.name, 'Toko Online', 'Shopee'],
+        [no_business.name, '-', '-'],
+    ]
+
+    details = client.get(f'/api/admin/user/{shop_owner.id}/details').json
+    assert (details['business_profile']['business_name'], details['business_profile']['marketplace_type']) == ('Toko Online', 'Shopee')
+    assert client.get(f'/api/admin/user/{no_business.id}/details').json['business_profile'] is None
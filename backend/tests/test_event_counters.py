@@ -0,0 +1,63 @@
+from conftest import make_user, make_event, login
+import app as app_module
+from app import db, Event, Ticket, recount_event_counters, warm_scanner_index
+
+
+def counters(*events):
+    db.session.expire_all()
+    return [(e.registered_count, e.checked_in_count) for e in Event.query.filter(Event.id.in_([e.id for e in events]))]
+
+
+def assert_counters_match_recount(*events):
+    stored = counters(*events)
+    recount_event_counters()
+    assert stored == counters(*events)
+    return stored
+
+
+def test_write_paths_keep_event_counters_in_sync(app):
+    app_module._scanner_indexes.clear()
+    event, other_event = make_event(), make_event(title='Event Lain')
+    panitia = make_user(role='panitia')
+    attendees = [make_user() for _ in range(6)]
+
+    codes = []
+    for attendee in attendees:
+        client = app.test_client()
+        login(client, attendee)
+        response = client.post('/api/tickets/buy', json={'event_id': event.id})
+        assert response.status_code == 201
+        codes.append(response.json['ticket_code'])
+        # Beli ulang ditolak dan tidak menaikkan counter.
+        assert client.post('/api/tickets/buy', json={'event_id': event.id}).status_code == 409
+    db.session.add(Ticket(user_id=attendees[0].id, event_id=other_event.id))
+    db.session.commit()
+    recount_event_counters()
+    assert assert_counters_match_recount(event, other_event) == [(6, 0), (1, 0)]
+
+    staff = app.test_client()
+    login(staff, panitia)
+
+    # /api/checkin jalur database, lalu scan ulang yang ditolak.
+    assert staff.post('/api/checkin', json={'ticket_code': codes[0], 'event_id': event.id}).status_code == 200
+    assert staff.post('/api/checkin', json={'ticket_code': codes[0]}).status_code == 409
+    assert assert_counters_match_recount(event, other_event) == [(6, 1), (1, 0)]
+
+    # Scan mobile jalur database.
+    assert staff.post('/api/mobile/panitia/scan', json={'ticket_code': codes[1]}).status_code == 200
+    assert staff.post('/api/mobile/panitia/scan', json={'ticket_code': codes[1]}).status_code == 409
+    assert assert_counters_match_recount(event, other_event) == [(6, 2), (1, 0)]
+
+    # Jalur cepat index scanner (web & mobile).
+    warm_scanner_index(db.session.get(Event, event.id))
+    assert staff.post('/api/checkin', json={'ticket_code': codes[2], 'event_id': event.id}).status_code == 200
+    assert staff.post('/api/mobile/panitia/scan', json={'ticket_code': codes[3]}).status_code == 200
+    assert staff.post('/api/mobile/panitia/scan', json={'ticket_code': codes[3]}).status_code == 409
+    assert assert_counters_match_recount(event, other_event) == [(6, 4), (1, 0)]
+
+    # Batch offline: dua baru, satu duplikat dalam batch, satu yang sudah dipakai.
+    response = staff.post('/api/checkin/batch', json={'scans': [
+        {'ticket_code': codes[4]}, {'ticket_code': codes[5]}, {'ticket_code': codes[5]}, {'ticket_code': codes[0]},
+    ]})
+    assert response.json['summary'] == {'ok': 2, 'already_used': 2}
+    assert assert_counters_match_recount(event, other_event) == [(6, 6), (1, 0)]
@@ -0,0 +1,48 @@
+from conftest import make_user, make_event, login
+from app import db, EventQuestion, UserTestScore, _question_cache, bump_event_questions_version
+
+
+def add_question(event, text, answer):
+    db.session.add(EventQuestion(
+        event_id=event.id, question_number=1, question_text=text,
+        option_a='A', option_b='B', option_c='C', option_d='D', correct_answer=answer,
+    ))
+
+
+def test_question_cache_follows_changes_from_other_workers(app):
+    _question_cache.clear()
+    event = make_event(has_pre_post_test=True)
+    add_question(event, 'Soal lama', 'A')
+    db.session.commit()
+    user = make_user()
+    client = app.test_client()
+    login(client, user)
+    assert client.get(f'/api/events/{event.id}/test/questions').json[0]['text'] == 'Soal lama'
+
+    # Worker lain mengganti soal: cache proses ini tidak di-invalidate, hanya versi di DB yang naik.
+    EventQuestion.query.filter_by(event_id=event.id).delete()
+    add_question(event, 'Soal baru', 'B')
+    bump_event_questions_version(event.id)
+    db.session.commit()
+
+    assert client.get(f'/api/events/{event.id}/test/questions').json[0]['text'] == 'Soal baru'
+    response = client.post(f'/api/events/{event.id}/test/submit', json={'answers': {'1': 'B'}})
+    assert response.json['score'] == 100
+    assert UserTestScore.query.one().pre_test_score == 100
+
+
+def test_submit_second_time_records_post_test(app):
+    _question_cache.clear()
+    event = make_event(has_pre_post_test=True)
+    add_question(event, 'Soal', 'C')
+    db.session.commit()
+    user = make_user()
+    client = app.test_client()
+    login(client, user)
+
+    assert client.post(f'/api/events/{event.id}/test/submit', json={'answers': {'1': 'A'}}).json['type'] == 'Pre-Test'
+    response = client.post(f'/api/events/{event.id}/test/submit', json={'answers': {'1': 'C'}})
+
+    assert response.json['type'] == 'Post-Test'
+    score = UserTestScore.query.one()
+    assert (score.pre_test_score, score.post_test_score) == (0, 100)
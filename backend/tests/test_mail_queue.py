@@ -0,0 +1,146 @@
+import socket
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import db, OutboundEmail, enqueue_email, process_mail_queue
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Server SMTP minimal di localhost: menyimpan setiap email, bisa menolak penerima tertentu."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, rejected_recipients=()):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.rejected_recipients = set(rejected_recipients)
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 sink')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode('utf-8', 'replace').rstrip('\r\n')
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO', 'NOOP', 'MAIL', 'RSET'):
+                if command in ('MAIL', 'RSET'):
+                    recipients = []
+                self.reply('250 ok')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip().strip('<>')
+                if address in self.server.rejected_recipients:
+                    self.reply('550 mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 ok')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                data = []
+                while True:
+                    data_line = self.rfile.readline().decode('utf-8', 'replace')
+                    if data_line in ('.\r\n', '.\n', ''):
+                        break
+                    data.append(data_line)
+                self.server.messages.append((recipients, ''.join(data)))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+@pytest.fixture
+def smtp_sink(app, monkeypatch):
+    sink = SMTPSink(rejected_recipients={'ditolak@okoce.test'})
+    thread = threading.Thread(target=sink.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(app.extensions['mail'], 'port', sink.port)
+    yield sink
+    sink.shutdown()
+    sink.server_close()
+
+
+def queue(*recipients):
+    for recipient in recipients:
+        enqueue_email(recipient, 'Kode Verifikasi', body=f'Halo {recipient}')
+    db.session.commit()
+
+
+def test_batch_is_delivered_over_one_connection(smtp_sink):
+    queue('a@okoce.test', 'b@okoce.test')
+
+    assert process_mail_queue() == (2, 0)
+
+    assert smtp_sink.connections == 1
+    assert sorted(r for recipients, _ in smtp_sink.messages for r in recipients) == ['a@okoce.test', 'b@okoce.test']
+    assert all('Kode Verifikasi' in body for _, body in smtp_sink.messages)
+    assert {e.status for e in OutboundEmail.query} == {'sent'}
+
+
+def test_rejected_recipient_is_rescheduled_with_backoff(smtp_sink):
+    queue('a@okoce.test', 'ditolak@okoce.test')
+
+    assert process_mail_queue() == (1, 1)
+
+    rejected = OutboundEmail.query.filter_by(recipient='ditolak@okoce.test').one()
+    assert rejected.status == 'pending'
+    assert rejected.attempts == 1
+    assert rejected.next_attempt_at > datetime.utcnow()
+    assert '550' in rejected.last_error
+    # Belum jatuh tempo: putaran berikutnya tidak mengirim apa pun.
+    assert process_mail_queue() == (0, 0)
+
+
+def test_unreachable_server_reschedules_whole_batch(app, monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        closed_port = probe.getsockname()[1]
+    monkeypatch.setattr(app.extensions['mail'], 'port', closed_port)
+    queue('a@okoce.test', 'b@okoce.test')
+
+    assert process_mail_queue() == (0, 2)
+
+    assert {(e.status, e.attempts) for e in OutboundEmail.query} == {('pending', 1)}
+
+
+def test_worker_starts_on_first_request_and_drains_leftovers(app, smtp_sink, monkeypatch):
+    # Email sisa sebelum restart: lease sudah kedaluwarsa, dan tidak ada email baru yang di-enqueue.
+    db.session.add(OutboundEmail(
+        recipient='sisa@okoce.test', subject='Sisa', body='x',
+        attempts=1, next_attempt_at=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    db.session.commit()
+
+    def run_once():
+        with app.app_context():
+            process_mail_queue()
+
+    monkeypatch.setattr(app_module, 'run_mail_worker', run_once)
+    monkeypatch.setattr(app_module, '_mail_worker_thread', None)
+    app.config['MAIL_QUEUE_WORKER'] = True
+    try:
+        app.test_client().get('/api/public/events')
+        app_module._mail_worker_thread.join(timeout=5)
+    finally:
+        app.config['MAIL_QUEUE_WORKER'] = False
+
+    assert [recipients for recipients, _ in smtp_sink.messages] == [['sisa@okoce.test']]
+    db.session.expire_all()
+    assert OutboundEmail.query.one().status == 'sent'
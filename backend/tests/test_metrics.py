@@ -0,0 +1,22 @@
+from conftest import make_user, login
+
+
+def test_metrics_does_not_trust_loopback(app):
+    client = app.test_client()
+
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+
+
+def test_metrics_allows_admin_token_and_allowlist(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'rahasia')
+    monkeypatch.setitem(app.config, 'METRICS_ALLOWLIST', {'10.0.0.5'})
+    admin, user = make_user(role='admin'), make_user()
+    client = app.test_client()
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer rahasia'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer salah'}).status_code == 403
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 200
+    login(client, user)
+    assert client.get('/metrics').status_code == 403
+    login(client, admin)
+    assert client.get('/metrics').status_code == 200
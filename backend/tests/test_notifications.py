@@ -0,0 +1,79 @@
+import threading
+
+from app import dispatch_notifications, FCM_MULTICAST_LIMIT
+
+
+class StubTransport:
+    """Transport palsu: mencatat setiap batch, bisa menggagalkan token atau seluruh batch."""
+
+    def __init__(self, failing_tokens=(), raise_on_batch=None, barrier=None):
+        self.calls = []
+        self.failing_tokens = set(failing_tokens)
+        self.raise_on_batch = raise_on_batch
+        self.barrier = barrier
+        self.lock = threading.Lock()
+
+    def __call__(self, tokens, title, body, data):
+        with self.lock:
+            self.calls.append((list(tokens), title, body, data, threading.current_thread().name))
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        if self.raise_on_batch is not None and self.raise_on_batch in tokens:
+            raise RuntimeError('FCM tidak tersedia')
+        return [(token, token not in self.failing_tokens, 'invalid' if token in self.failing_tokens else None)
+                for token in tokens]
+
+
+def tokens(prefix, count):
+    return [f'{prefix}-{i}' for i in range(count)]
+
+
+def test_tokens_are_split_into_multicast_batches():
+    transport = StubTransport()
+    jobs = [
+        ('Judul A', 'Isi A', {'event_id': '1'}, tokens('a', FCM_MULTICAST_LIMIT * 2 + 7)),
+        ('Judul B', 'Isi B', {'event_id': '2'}, tokens('b', 3)),
+    ]
+
+    stats = dispatch_notifications(jobs, transport=transport, workers=4)
+
+    sizes = sorted((call[1], len(call[0])) for call in transport.calls)
+    assert sizes == [('Judul A', 7), ('Judul A', FCM_MULTICAST_LIMIT), ('Judul A', FCM_MULTICAST_LIMIT), ('Judul B', 3)]
+    assert all(len(call[0]) <= FCM_MULTICAST_LIMIT for call in transport.calls)
+    assert stats == {'batches': 4, 'sent': FCM_MULTICAST_LIMIT * 2 + 10, 'failed': 0, 'failures': []}
+
+
+def test_batches_are_sent_concurrently():
+    # Barrier hanya lolos bila dua batch berada di transport pada saat yang sama.
+    transport = StubTransport(barrier=threading.Barrier(2))
+    jobs = [('Judul', 'Isi', {}, tokens('t', FCM_MULTICAST_LIMIT + 1))]
+
+    stats = dispatch_notifications(jobs, transport=transport, workers=2)
+
+    assert stats['sent'] == FCM_MULTICAST_LIMIT + 1
+    assert len({call[4] for call in transport.calls}) == 2
+
+
+def test_failed_batch_and_tokens_are_reported_without_stopping_others():
+    transport = StubTransport(failing_tokens={'ok-1'}, raise_on_batch='bad-0')
+    jobs = [
+        ('Judul', 'Isi', {}, tokens('ok', 3)),
+        ('Judul', 'Isi', {}, tokens('bad', 2)),
+    ]
+
+    stats = dispatch_notifications(jobs, transport=transport, workers=2)
+
+    assert len(transport.calls) == 2
+    assert stats['sent'] == 2
+    assert stats['failed'] == 3
+    failures = dict(stats['failures'])
+    assert failures['ok-1'] == 'invalid'
+    assert failures['bad-0'] == failures['bad-1'] == 'FCM tidak tersedia'
+
+
+def test_no_tokens_sends_nothing():
+    transport = StubTransport()
+    assert dispatch_notifications([('Judul', 'Isi', {}, [])], transport=transport, workers=2) == {
+        'batches': 0, 'sent': 0, 'failed': 0, 'failures': []
+    }
+    assert transport.calls == []
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from conftest import make_event, reset_process_caches
+import bench
+from app import app as flask_app, db, QUERY_BUDGETS
+
+# Dua ukuran dataset seed-load; setiap relasi (tiket, check-in, skor, sub-record UMKM) punya banyak baris.
+SMALL = ['--users', '40', '--businesses', '8', '--events', '12', '--tickets', '300']
+LARGE = ['--users', '160', '--businesses', '32', '--events', '16', '--tickets', '900']
+
+
+def probe_query_counts(app, volumes):
+    """Menjalankan semua probe check-query-budgets (termasuk write) dan mengembalikan jumlah query terbesar per endpoint."""
+    result = app.test_cli_runner().invoke(args=['seed-load', *volumes])
+    assert result.exit_code == 0, result.output
+    make_event(title='Pendaftaran Dibuka', slot_peserta=500)
+    reset_process_caches()
+    probes = bench.budget_probes(include_writes=True)
+    send = bench.test_client_transport()
+
+    counts = {}
+    db.event.listen(db.engine, 'before_cursor_execute', bench.count_statement)
+    try:
+        for endpoint, method, path, user_id, json_body, form in probes:
+            # Kasus terburuk: query user_loader ikut dihitung. Anggaran ditegakkan (TESTING),
+            # jadi request yang melebihi anggaran langsung gagal dengan daftar query-nya.
+            bench._identity_cache.clear()
+            status, _, statements = send(method, path, user_id=user_id, json_body=json_body, form=form)
+            assert status < 400, (endpoint, path, status)
+            counts[endpoint] = max(counts.get(endpoint, 0), statements)
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', bench.count_statement)
+        for thread in threading.enumerate():
+            if thread.name == 'scanner-warm':
+                thread.join(timeout=5)
+    return counts
+
+
+@pytest.mark.parametrize('volumes', [SMALL, LARGE], ids=['small', 'large'])
+def test_every_budgeted_route_stays_within_budget(app, volumes):
+    assert flask_app.config['QUERY_BUDGETS_ENFORCED'] in (None, True)
+
+    counts = probe_query_counts(app, volumes)
+
+    assert set(counts) == set(QUERY_BUDGETS)
+    assert all(counts[endpoint] <= budget for endpoint, budget in QUERY_BUDGETS.items())
@@ -0,0 +1,40 @@
+import threading
+
+from conftest import make_user, make_event, login
+import app as app_module
+from app import db, Ticket
+
+
+def join_warm_threads():
+    for thread in threading.enumerate():
+        if thread.name == 'scanner-warm':
+            thread.join(timeout=5)
+
+
+def test_database_path_scan_warms_index_in_background_once(app, monkeypatch):
+    app_module._scanner_indexes.clear()
+    event = make_event()
+    panitia, attendee, other = make_user(role='panitia'), make_user(), make_user()
+    tickets = [Ticket(user_id=attendee.id, event_id=event.id), Ticket(user_id=other.id, event_id=event.id)]
+    db.session.add_all(tickets)
+    db.session.commit()
+
+    warmed = []
+    warm = app_module.warm_scanner_index
+    monkeypatch.setattr(app_module, 'warm_scanner_index', lambda e: warmed.append(e.id) or warm(e))
+    release = threading.Event()
+    run_warm = app_module.run_scanner_index_warm
+    monkeypatch.setattr(app_module, 'run_scanner_index_warm', lambda event_id: release.wait(5) and run_warm(event_id))
+    client = app.test_client()
+    login(client, panitia)
+
+    # Dua scan pertama lewat jalur database: tidak ada warm di dalam request, hanya satu yang dijadwalkan.
+    assert client.post('/api/mobile/panitia/scan', json={'ticket_code': tickets[0].ticket_code}).status_code == 200
+    assert app_module.schedule_scanner_index_warm(event.id) is False
+    assert warmed == []
+    release.set()
+    join_warm_threads()
+
+    assert warmed == [event.id]
+    assert app_module.find_scanner_ticket(tickets[1].ticket_code, event.id) is not None
+    assert app_module.schedule_scanner_index_warm(event.id) is False
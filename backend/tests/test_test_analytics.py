@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from conftest import make_user, make_event
+import app as app_module
+from app import db, UserTestScore
+
+
+def test_analytics_cache_sees_scores_written_by_other_workers(app):
+    app_module._test_analytics_cache.clear()
+    event = make_event(has_pre_post_test=True)
+    first, second = make_user(), make_user()
+    db.session.add(UserTestScore(user_id=first.id, event_id=event.id, pre_test_score=40,
+                                 pre_test_submitted_at=datetime.utcnow()))
+    db.session.commit()
+    assert app_module.test_score_analytics()['overall']['participants'] == 1
+
+    # Worker lain menyimpan nilai: listener ORM proses ini tidak terpanggil.
+    db.session.execute(UserTestScore.__table__.insert().values(
+        user_id=second.id, event_id=event.id, pre_test_score=60, pre_test_submitted_at=datetime.utcnow()
+    ))
+    db.session.execute(UserTestScore.__table__.update().where(UserTestScore.user_id == first.id).values(
+        post_test_score=90, post_test_submitted_at=datetime.utcnow()
+    ))
+    db.session.commit()
+
+    overall = app_module.test_score_analytics()['overall']
+    assert (overall['participants'], overall['completed'], overall['mean_post']) == (2, 1, 90)
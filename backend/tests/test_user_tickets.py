@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from conftest import make_user, make_event, login
+from app import db, Ticket, UserTestScore, reserve_event_slot, recount_event_counters
+
+
+def test_ticket_list_etag_ignores_other_attendees_counters(app):
+    event = make_event()
+    attendee, other = make_user(), make_user()
+    db.session.add(Ticket(user_id=attendee.id, event_id=event.id))
+    db.session.commit()
+    client = app.test_client()
+    login(client, attendee)
+    etag = client.get(f'/api/users/{attendee.id}/tickets').headers['ETag']
+
+    # Registrasi & check-in peserta lain hanya mengubah counter event.
+    assert reserve_event_slot(event.id)
+    db.session.add(Ticket(user_id=other.id, event_id=event.id))
+    db.session.commit()
+    recount_event_counters()
+    event.description = 'Deskripsi baru'
+    db.session.commit()
+
+    assert client.get(f'/api/users/{attendee.id}/tickets', headers={'If-None-Match': etag}).status_code == 304
+
+    event.title = 'Pelatihan UMKM (Diperbarui)'
+    db.session.commit()
+
+    response = client.get(f'/api/users/{attendee.id}/tickets', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json[0]['event_title'] == 'Pelatihan UMKM (Diperbarui)'
+
+
+def test_ticket_list_etag_changes_on_back_dated_check_in(app):
+    first_event, second_event = make_event(), make_event(title='Event Kedua')
+    attendee, panitia = make_user(), make_user(role='panitia')
+    first, second = Ticket(user_id=attendee.id, event_id=first_event.id), Ticket(user_id=attendee.id, event_id=second_event.id)
+    db.session.add_all([first, second])
+    db.session.commit()
+    staff = app.test_client()
+    login(staff, panitia)
+    client = app.test_client()
+    login(client, attendee)
+
+    assert staff.post('/api/checkin', json={'ticket_code': first.ticket_code}).status_code == 200
+    etag = client.get(f'/api/users/{attendee.id}/tickets').headers['ETag']
+
+    # Sinkronisasi offline: waktu scan asli lebih lama dari check-in terakhir.
+    scanned_at = (datetime.utcnow() - timedelta(hours=2)).isoformat() + 'Z'
+    response = staff.post('/api/checkin/batch', json={'scans': [{'ticket_code': second.ticket_code, 'scanned_at': scanned_at}]})
+    assert response.json['summary'] == {'ok': 1}
+
+    response = client.get(f'/api/users/{attendee.id}/tickets', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [ticket['is_checked_in'] for ticket in response.json] == [True, True]
+
+
+def test_ticket_list_etag_changes_when_score_changes(app):
+    event = make_event(has_pre_post_test=True)
+    attendee = make_user()
+    db.session.add(Ticket(user_id=attendee.id, event_id=event.id))
+    score = UserTestScore(user_id=attendee.id, event_id=event.id, pre_test_score=40, pre_test_submitted_at=datetime.utcnow())
+    db.session.add(score)
+    db.session.commit()
+    client = app.test_client()
+    login(client, attendee)
+    etag = client.get(f'/api/users/{attendee.id}/tickets').headers['ETag']
+
+    score.post_test_score = 80
+    db.session.commit()
+
+    assert client.get(f'/api/users/{attendee.id}/tickets', headers={'If-None-Match': etag}).status_code == 200
@@ -156,7 +156,7 @@ class _EventDetailPageState extends State<EventDetailPage> {
               if (imageName == null || imageName.isEmpty) {
                 return Container(height: 250, color: Colors.grey[300], child: Center(child: Icon(Icons.image_not_supported, size: 100, color: Colors.grey[600])));
               }
-              final String imageUrl = '${AppConfig.apiBaseUrl}/uploads/$imageName';
+              final String imageUrl = widget.event['image_variants']?['full'] ?? '${AppConfig.apiBaseUrl}/uploads/$imageName';
               return Image.network(imageUrl, height: 250, width: double.infinity, fit: BoxFit.cover,
                 loadingBuilder: (ctx, child, progress) => progress == null ? child : Container(height: 250, color: Colors.grey[300], child: const Center(child: CircularProgressIndicator())),
                 errorBuilder: (ctx, err, stack) => Container(height: 250, color: Colors.grey[300], child: Center(child: Icon(Icons.broken_image, size: 100, color: Colors.grey[600]))),
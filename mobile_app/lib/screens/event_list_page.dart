@@ -147,7 +147,8 @@ class _EventListPageState extends State<EventListPage> {
                             if (imageName == null || imageName.isEmpty) {
                               return Container(height: 180, color: Colors.grey[300], child: Center(child: Icon(Icons.image_not_supported, size: 50, color: Colors.grey[600])));
                             }
-                            final String imageUrl = '${AppConfig.apiBaseUrl}/uploads/$imageName';
+                            // Varian 'card' (WebP kecil) dari server; fallback ke file asli untuk server lama.
+                            final String imageUrl = event['image_url'] ?? '${AppConfig.apiBaseUrl}/uploads/$imageName';
                             return Image.network(
                               imageUrl, height: 180, width: double.infinity, fit: BoxFit.cover,
                               loadingBuilder: (ctx, child, progress) => progress == null ? child : Container(height: 180, color: Colors.grey[300], child: const Center(child: CircularProgressIndicator())),
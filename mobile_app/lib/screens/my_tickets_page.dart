@@ -26,7 +26,7 @@ class _MyTicketsPageState extends State<MyTicketsPage> {
     }
 
     try {
-      final response = await HttpClient.get('/api/users/$userId/tickets');
+      final response = await HttpClient.getCached('/api/users/$userId/tickets');
 
       if (response.statusCode == 200) {
         return json.decode(response.body);
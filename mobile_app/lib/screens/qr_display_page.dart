@@ -1,7 +1,6 @@
 
 import 'package:flutter/material.dart';
 import 'package:qr_flutter/qr_flutter.dart';
-import 'dart:async';
 import 'dart:convert';
 import 'package:eventit/utils/http_client.dart';
 import 'package:eventit/screens/checkin_success_screen.dart';
@@ -25,62 +24,70 @@ class QrDisplayPage extends StatefulWidget {
 }
 
 class _QrDisplayPageState extends State<QrDisplayPage> {
-  Timer? _pollingTimer;
+  bool _isWaiting = false;
 
   @override
   void initState() {
     super.initState();
-    startPolling();
+    startWaiting();
   }
 
   @override
   void dispose() {
-    _pollingTimer?.cancel();
+    _isWaiting = false;
     super.dispose();
   }
 
-  void startPolling() {
-    _pollingTimer = Timer.periodic(const Duration(seconds: 3), (timer) {
-      _checkTicketStatus();
-    });
-  }
-
-  Future<void> _checkTicketStatus() async {
-    if (!mounted) {
-      _pollingTimer?.cancel();
-      return;
+  // Long-poll: server menahan request sampai tiket di-scan panitia (maks 20 detik),
+  // lalu langsung disambung lagi. Jauh lebih ringan daripada polling tiap 3 detik.
+  Future<void> startWaiting() async {
+    _isWaiting = true;
+    while (_isWaiting && mounted) {
+      final done = await _waitTicketStatus();
+      if (done) {
+        _isWaiting = false;
+      }
     }
+  }
 
+  Future<bool> _waitTicketStatus() async {
     try {
       final response = await HttpClient.get(
-        '/api/tickets/status/${widget.ticketCode}',
+        '/api/tickets/status/${widget.ticketCode}/wait?timeout=20',
+        timeout: const Duration(seconds: 30),
       );
 
-      if (!mounted) return;
+      if (!mounted) return true;
 
       if (response.statusCode == 200) {
         final data = json.decode(response.body);
         if (data['is_checked_in'] == true) {
-          _pollingTimer?.cancel();
-
           Navigator.of(context).pushReplacement(MaterialPageRoute(
             builder: (context) => CheckinSuccessScreen(
               userName: widget.userName,
               eventTitle: widget.eventTitle,
             ),
           ));
-        } else {
-          print("Polling: Tiket ${widget.ticketCode} belum check-in.");
+          return true;
         }
+        print("Long-poll: Tiket ${widget.ticketCode} belum check-in.");
+        // Server sedang penuh dan menjawab tanpa menahan request: tunggu sebelum menyambung lagi.
+        if (data['retry_after'] != null) {
+          await Future.delayed(Duration(seconds: data['retry_after']));
+        }
+        return false;
       } else if (response.statusCode == 401 || response.statusCode == 403) {
-        _pollingTimer?.cancel();
         _handleUnauthorized();
+        return true;
       } else {
-        print("Polling error: ${response.statusCode}");
+        print("Long-poll error: ${response.statusCode}");
       }
     } catch (e) {
-      print("Polling exception: $e");
+      print("Long-poll exception: $e");
     }
+
+    await Future.delayed(const Duration(seconds: 3));
+    return false;
   }
 
   void _handleUnauthorized() async {
@@ -11,6 +11,7 @@ import 'package:eventit/config.dart';
 class HttpClient {
   static http.Client? _client;
   static PersistCookieJar? _cookieJar;
+  static final Map<String, MapEntry<String, String>> _etagCache = {};
 
   static Future<void> initialize() async {
     if (_client == null) {
@@ -55,7 +56,7 @@ class HttpClient {
     }
   }
 
-  static Future<http.Response> get(String endpoint) async {
+  static Future<http.Response> get(String endpoint, {Duration timeout = const Duration(seconds: 15)}) async {
     try {
       if (_client == null) await initialize();
       final url = Uri.parse('${AppConfig.apiBaseUrl}$endpoint');
@@ -67,9 +68,43 @@ class HttpClient {
 
       print('--- DEBUG [GET] URL: $url');
 
+      final response = await _client!.get(url, headers: headers).timeout(timeout);
+
+      await _saveCookies(url, response);
+      return response;
+
+    } catch (e) {
+      throw _handleError(e);
+    }
+  }
+
+  // GET dengan conditional request (If-None-Match). Jika server menjawab 304,
+  // body terakhir dari cache dikembalikan sebagai 200 tanpa mengunduh ulang.
+  static Future<http.Response> getCached(String endpoint) async {
+    try {
+      if (_client == null) await initialize();
+      final url = Uri.parse('${AppConfig.apiBaseUrl}$endpoint');
+      final cookieHeader = await _getCookieHeader(url);
+      final cached = _etagCache[endpoint];
+      final headers = {
+        'Content-Type': 'application/json',
+        if (cookieHeader.isNotEmpty) 'cookie': cookieHeader,
+        if (cached != null) 'If-None-Match': cached.key,
+      };
+
+      print('--- DEBUG [GET cached] URL: $url');
+
       final response = await _client!.get(url, headers: headers).timeout(const Duration(seconds: 15));
 
       await _saveCookies(url, response);
+
+      if (response.statusCode == 304 && cached != null) {
+        return http.Response(cached.value, 200, headers: response.headers);
+      }
+      final etag = response.headers['etag'];
+      if (response.statusCode == 200 && etag != null) {
+        _etagCache[endpoint] = MapEntry(etag, response.body);
+      }
       return response;
 
     } catch (e) {
@@ -101,6 +136,7 @@ class HttpClient {
   }
 
   static Future<void> clearCookies() async {
+    _etagCache.clear();
     if (_cookieJar != null) {
       await _cookieJar!.deleteAll();
     } else {